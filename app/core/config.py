@@ -6,6 +6,8 @@ class Settings(BaseSettings):
     app_name: str
     app_env: str
     app_url: str
+    # "api-only" workers never load the ML models and reject face inference
+    app_mode: str = "all"
 
     # Database
     db_conn: str
@@ -21,6 +23,31 @@ class Settings(BaseSettings):
     aws_region_name: str
     aws_bucket: str
     aws_url: str
+    presign_cache_size: int = 10000
+    # Seconds before expiry at which a cached presigned URL is signed again
+    presign_margin_seconds: int = 300
+    # Uploads larger than one part are sent as multipart uploads, reading at most
+    # part size * concurrency bytes of the file at a time
+    s3_part_size_mb: int = 8
+    s3_upload_concurrency: int = 4
+    # Threads shared by batched uploads such as face previews and renditions
+    s3_upload_workers: int = 8
+    # Renditions uploaded next to every photo, "WEBP" or "JPEG"
+    derivative_format: str = "WEBP"
+    derivative_quality: int = 80
+    thumbnail_max_edge: int = 320
+    medium_max_edge: int = 1280
+
+    # Storage
+    # "s3" keeps files in AWS_BUCKET, "local" keeps them under LOCAL_STORAGE_ROOT behind /media
+    storage_backend: str = "s3"
+    local_storage_root: str = "storage"
+    # Base URL of the /media route, APP_URL/media/ when empty
+    local_storage_url: str = ""
+    # nginx internal location aliased to LOCAL_STORAGE_ROOT, empty serves the files from the app
+    local_storage_accel_prefix: str = ""
+    # HMAC key of the signed /media URLs, required by the local backend
+    local_storage_signing_key: str = ""
 
     # security
     jwt_secret_key: str
@@ -37,6 +64,39 @@ class Settings(BaseSettings):
 
     # Model Machine Learning
     pre_trained_model: str
+    # "tensorflow" runs the frozen graph, "onnx" runs ONNX_MODEL with ONNX Runtime
+    embedding_backend: str = "tensorflow"
+    onnx_model: str = "facenet.onnx"
+    onnx_threads: int = 0
+    # Longest image edge used for face detection, 0 detects at full resolution
+    detection_max_edge: int = 1600
+    # Processes running detection and embedding, 0 runs them in the calling thread
+    inference_workers: int = 2
+    # Load the models at startup instead of on the first request
+    inference_preload: bool = False
+    # Upload hashes whose boxes and embeddings are kept in memory
+    inference_cache_size: int = 1024
+
+    # FAISS
+    faiss_checkpoint_interval: int = 1000
+    faiss_index_type: str = "flat"
+    faiss_nlist: int = 1024
+    faiss_nprobe: int = 16
+    faiss_hnsw_m: int = 32
+    faiss_ef_construction: int = 40
+    faiss_ef_search: int = 64
+    faiss_pq_m: int = 128
+    # Compressed (sq8/pq) indexes range-search a radius widened by this fraction and keep the hits
+    # whose exact distance is inside the threshold, 0 uses the compressed distances as they are
+    faiss_rerank_margin: float = 0.25
+    faiss_mmap: bool = False
+    # Registered user faces, matched against new sell photos on ingest
+    face_index_file: str = "faiss_faces.bin"
+    face_match_threshold: float = 0.8
+
+    # Ingest
+    ingest_workers: int = 2
+    ingest_queue_size: int = 100
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,72 @@
+from io import BytesIO
+from typing import BinaryIO, Dict, Iterator, List, Tuple, Union
+
+from PIL import Image, ImageOps
+
+from app.core.config import config
+from app.core.storage import storage
+
+# Renditions stored next to every uploaded photo, largest first so each one is reduced from the previous
+DERIVATIVE_SIZES: Dict[str, int] = {
+    "medium": config.medium_max_edge,
+    "thumbnail": config.thumbnail_max_edge,
+}
+
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg"}
+
+
+def derivative_key(path: str, size: str) -> str:
+    # photos/sell/<uuid>_<name>.jpg -> photos/sell/<size>/<uuid>_<name>.webp
+    directory, _, name = path.rpartition("/")
+    stem = name.rsplit(".", 1)[0] if "." in name else name
+    key = f"{size}/{stem}.{EXTENSIONS[config.derivative_format.upper()]}"
+    return f"{directory}/{key}" if directory else key
+
+
+def render_derivatives(data: Union[bytes, BinaryIO]) -> Iterator[Tuple[str, BytesIO]]:
+    # File objects are decoded as they are read, without a copy of the encoded bytes
+    image = Image.open(BytesIO(data) if isinstance(data, bytes) else data)
+    # JPEGs are decoded at the smallest DCT scale that still covers the largest rendition
+    largest = max(DERIVATIVE_SIZES.values())
+    image.draft("RGB", (largest, largest))
+    # The renditions carry no EXIF, so the orientation is applied to the pixels
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image_format = config.derivative_format.upper()
+    for size, max_edge in sorted(DERIVATIVE_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        output = BytesIO()
+        image.save(output, format=image_format, quality=config.derivative_quality)
+        output.seek(0)
+        yield size, output
+
+
+def derivative_uploads(data: Union[bytes, BinaryIO], path: str) -> Tuple[Dict[str, str], List[Tuple[BytesIO, str]]]:
+    # Returns the rendition URLs and the (file, key) pairs to pass to storage.upload_many
+    derivatives = {}
+    uploads = []
+    for size, output in render_derivatives(data):
+        key = derivative_key(path, size)
+        uploads.append((output, key))
+        derivatives[size] = storage.url(key)
+    return derivatives, uploads
+
+
+def upload_derivatives(data: Union[bytes, BinaryIO], path: str) -> Dict[str, str]:
+    derivatives, uploads = derivative_uploads(data, path)
+    storage.upload_many(uploads)
+    return derivatives
+
+
+def presign_photos(photos: List[dict]):
+    # Sets url, thumbnail_url and medium_url of a page of photos in one presign pass.
+    # Photos uploaded before renditions existed fall back to the original.
+    urls = []
+    for photo in photos:
+        derivatives = photo.get("derivatives") or {}
+        urls.append(photo["url"])
+        urls.extend(derivatives.get(size, photo["url"]) for size in DERIVATIVE_SIZES)
+    presigned = iter(storage.presign_urls(urls))
+    for photo in photos:
+        photo["url"] = next(presigned)
+        for size in DERIVATIVE_SIZES:
+            photo[f"{size}_url"] = next(presigned)
@@ -1,27 +1,59 @@
 from io import BytesIO
+from typing import Union
 from PIL import Image
 from fastapi import UploadFile
 from mtcnn import MTCNN
 import numpy as np
+from app.core.config import config
 
 class FaceDetector:
-    def __init__(self):
+    def __init__(self, max_edge=None):
         self.detector = MTCNN()
+        self.max_edge = config.detection_max_edge if max_edge is None else max_edge
 
-    def read_image(self, image: UploadFile):
-        image = Image.open(BytesIO(image.file.read()))
-        image = image.convert("RGB")
-        return np.array(image)
+    def detection_size(self, size):
+        width, height = size
+        if not self.max_edge or max(width, height) <= self.max_edge:
+            return size
+        scale = max(width, height) / self.max_edge
+        return max(round(width / scale), 1), max(round(height / scale), 1)
 
-    def detect_faces(self, image: UploadFile):
-        image = self.read_image(image)
-        detections = self.detector.detect_faces(image)
+    def detection_image(self, image: Image.Image):
+        size = self.detection_size(image.size)
+        if size != image.size:
+            # JPEGs that are not decoded yet are decoded directly at a reduced scale
+            image.draft("RGB", size)
+            image = image if image.mode == "RGB" else image.convert("RGB")
+            image = image.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return np.array(image if image.mode == "RGB" else image.convert("RGB"))
+
+    def detect_faces(self, image: Union[UploadFile, bytes, Image.Image, np.ndarray]):
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        if isinstance(image, Image.Image):
+            # The caller's image keeps its full resolution for the crops, draft mode only
+            # applies to the copy that is reduced for detection
+            detection = self.detection_image(image.copy())
+            image = image if image.mode == "RGB" else image.convert("RGB")
+        else:
+            # Detection gets its own lazily decoded copy so draft mode does not touch the full image
+            data = image if isinstance(image, bytes) else image.file.read()
+            detection = self.detection_image(Image.open(BytesIO(data)))
+            image = Image.open(BytesIO(data))
+            image = image if image.mode == "RGB" else image.convert("RGB")
+
+        # MTCNN runs on the reduced image, boxes are mapped back and faces are cropped at full resolution
+        scale_x = image.width / detection.shape[1]
+        scale_y = image.height / detection.shape[0]
+        detections = self.detector.detect_faces(detection)
         faces = []
         for detection in detections:
             x, y, width, height = detection["box"]
             x, y = max(x, 0), max(y, 0)
-            face = image[y:y + height, x:x + width]
+            x, y = round(x * scale_x), round(y * scale_y)
+            width, height = round(width * scale_x), round(height * scale_y)
+            face = np.array(image.crop((x, y, min(x + width, image.width), min(y + height, image.height))))
             faces.append((face, (x, y, width, height)))
         return faces
 
-face_detector = FaceDetector()
\ No newline at end of file
+face_detector = FaceDetector()
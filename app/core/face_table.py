@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+from bson import ObjectId
+
+
+class FaceTable:
+    def __init__(self, capacity=1024):
+        self.lock = threading.Lock()
+        self.photo_ids = np.zeros((capacity, 12), dtype=np.uint8)
+        self.detections = np.full(capacity, -1, dtype=np.int16)
+        # Marks the slots that hold a face, faiss ids are never reused
+        self.used = np.zeros(capacity, dtype=bool)
+        self.load_lock = threading.Lock()
+        self.loaded = False
+
+    def __len__(self):
+        return int(np.count_nonzero(self.used))
+
+    def ensure(self, size):
+        capacity = len(self.used)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        grow = capacity - len(self.used)
+        self.photo_ids = np.concatenate([self.photo_ids, np.zeros((grow, 12), dtype=np.uint8)])
+        self.detections = np.concatenate([self.detections, np.full(grow, -1, dtype=np.int16)])
+        self.used = np.concatenate([self.used, np.zeros(grow, dtype=bool)])
+
+    def set_photo(self, photo_id: ObjectId, faiss_ids: list):
+        faiss_ids = [(index, faiss_id) for index, faiss_id in enumerate(faiss_ids) if faiss_id is not None]
+        if not faiss_ids:
+            return
+        with self.lock:
+            self.ensure(max(faiss_id for _, faiss_id in faiss_ids) + 1)
+            for index, faiss_id in faiss_ids:
+                self.photo_ids[faiss_id] = np.frombuffer(photo_id.binary, dtype=np.uint8)
+                self.detections[faiss_id] = index
+                self.used[faiss_id] = True
+
+    def load(self, photos):
+        for photo in photos:
+            self.set_photo(photo["_id"], [detection.get("faiss_id") for detection in photo.get("detections", [])])
+
+    def ensure_loaded(self, find_photos):
+        # Filled from Mongo on the first lookup, workers that never match faces skip the scan
+        if self.loaded:
+            return
+        with self.load_lock:
+            if not self.loaded:
+                self.load(find_photos())
+                self.loaded = True
+
+    def remove(self, faiss_ids: list):
+        with self.lock:
+            faiss_ids = [faiss_id for faiss_id in faiss_ids if faiss_id < len(self.used)]
+            self.used[faiss_ids] = False
+            self.detections[faiss_ids] = -1
+
+    def get(self, faiss_id: int):
+        faiss_id = int(faiss_id)
+        if faiss_id < 0 or faiss_id >= len(self.used) or not self.used[faiss_id]:
+            return None
+        return {
+            "photo_id": ObjectId(self.photo_ids[faiss_id].tobytes()),
+            "detection": int(self.detections[faiss_id]),
+            "preview_key": self.preview_key(faiss_id),
+        }
+
+    @staticmethod
+    def preview_key(faiss_id: int):
+        return f"watermark/{faiss_id}.jpg"
+
+face_table = FaceTable()
@@ -1,28 +1,117 @@
-import tensorflow as tf
+import threading
+
 from app.core.config import config
 import numpy as np
 
-class FaceNetModel:
-    def __init__(self):
+# FaceNet takes 160x160 RGB faces and returns 512-dimensional embeddings
+FACE_SIZE = 160
+EMBEDDING_DIM = 512
+
+class EmbeddingBackend:
+    name = "base"
+
+    def get_embeddings(self, image):
+        return self.get_embeddings_batch([image])
+
+    def get_embeddings_batch(self, faces):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class FaceNetModel(EmbeddingBackend):
+    name = "tensorflow"
+
+    def __init__(self, model_path=None):
+        import tensorflow as tf
+
         self.model = tf.Graph()
         with self.model.as_default():
             graph_def = tf.compat.v1.GraphDef()
-            with tf.io.gfile.GFile(config.pre_trained_model, 'rb') as f:
+            with tf.io.gfile.GFile(model_path or config.pre_trained_model, 'rb') as f:
                 graph_def.ParseFromString(f.read())
                 tf.import_graph_def(graph_def, name='')
 
-    def get_embeddings(self, image):
-        with tf.compat.v1.Session(graph=self.model) as sess:
-            input_set = sess.graph.get_tensor_by_name('input:0')
-            embeddings = sess.graph.get_tensor_by_name('embeddings:0')
-            phase_train = sess.graph.get_tensor_by_name('phase_train:0')
+            # Preprocessing ops are built once so the graph does not grow on every call
+            self.face_input = tf.compat.v1.placeholder(tf.float32, shape=(None, None, 3), name='face_input')
+            face = tf.image.resize(self.face_input, (FACE_SIZE, FACE_SIZE))
+            self.face_output = tf.image.per_image_standardization(face)
+
+        self.input_set = self.model.get_tensor_by_name('input:0')
+        self.embeddings = self.model.get_tensor_by_name('embeddings:0')
+        self.phase_train = self.model.get_tensor_by_name('phase_train:0')
+        self.model.finalize()
+        self.session = tf.compat.v1.Session(graph=self.model)
+
+    def preprocess(self, image):
+        return self.session.run(self.face_output, feed_dict={self.face_input: image})
+
+    def get_embeddings_batch(self, faces):
+        if not faces:
+            return np.empty((0, EMBEDDING_DIM), dtype='float32')
+        images = np.stack([self.preprocess(face) for face in faces])
+        feed_dict = {self.input_set: images, self.phase_train: False}
+        return self.session.run(self.embeddings, feed_dict=feed_dict)
+
+    def close(self):
+        self.session.close()
+
+class OnnxFaceNetModel(EmbeddingBackend):
+    name = "onnx"
+
+    def __init__(self, model_path=None, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        threads = config.onnx_threads if threads is None else threads
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path or config.onnx_model, options, providers=["CPUExecutionProvider"])
+        # Exports keep the boolean phase_train input unless it was folded into a constant
+        self.input_name = None
+        self.phase_train_name = None
+        for model_input in self.session.get_inputs():
+            if model_input.type == "tensor(bool)":
+                self.phase_train_name = model_input.name
+            else:
+                self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+
+    def preprocess(self, image):
+        import cv2
+
+        # Bilinear with half-pixel centers and no antialiasing, the same as tf.image.resize
+        face = cv2.resize(np.asarray(image, dtype='float32'), (FACE_SIZE, FACE_SIZE), interpolation=cv2.INTER_LINEAR)
+        # Same as tf.image.per_image_standardization
+        std = max(face.std(), 1.0 / np.sqrt(face.size))
+        return (face - face.mean()) / std
+
+    def get_embeddings_batch(self, faces):
+        if not faces:
+            return np.empty((0, EMBEDDING_DIM), dtype='float32')
+        feed = {self.input_name: np.stack([self.preprocess(face) for face in faces]).astype('float32')}
+        if self.phase_train_name:
+            feed[self.phase_train_name] = np.array(False)
+        return self.session.run([self.output_name], feed)[0]
 
-            image = tf.image.resize(image, (160, 160))
-            image = tf.image.per_image_standardization(image)
-            image = tf.expand_dims(image, 0)
+def create_embedding_backend(backend=None) -> EmbeddingBackend:
+    backend = backend or config.embedding_backend
+    if backend == "onnx":
+        return OnnxFaceNetModel()
+    # An exported or int8-quantized model can also be selected through PRE_TRAINED_MODEL
+    if config.pre_trained_model.endswith(".onnx"):
+        return OnnxFaceNetModel(config.pre_trained_model)
+    if backend == "tensorflow":
+        return FaceNetModel()
+    raise ValueError(f"Unknown embedding backend: {backend}")
 
-            feed_dict = {input_set: image.eval(session = sess), phase_train: False}
-            emb = sess.run(embeddings, feed_dict=feed_dict)
-            return emb
+facenet_model = None
+facenet_model_lock = threading.Lock()
 
-facenet_model = FaceNetModel()
\ No newline at end of file
+def get_facenet_model() -> EmbeddingBackend:
+    # Built on first use, importing this module does not load a model
+    global facenet_model
+    with facenet_model_lock:
+        if facenet_model is None:
+            facenet_model = create_embedding_backend()
+        return facenet_model
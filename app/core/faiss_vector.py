@@ -1,52 +1,560 @@
+import fcntl
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from uuid import uuid4
+
 import faiss
 import numpy as np
+from app.core.config import config
 from app.core.logger import logger
 
+# The WAL starts with a header holding the next free faiss id at the last checkpoint and
+# the number of tombstones carried over from it, followed by those remove records and then
+# add records (op, id, float32 vector) and remove records (op, id).
+WAL_MAGIC = b"FWL2"
+WAL_HEADER = struct.Struct("<4sqq")
+# Header of WALs written before tombstones were counted: magic and next free id
+WAL_MAGIC_V1 = b"FWAL"
+WAL_HEADER_V1 = struct.Struct("<4sq")
+WAL_RECORD = struct.Struct("<Bq")
+WAL_ADD = 1
+WAL_REMOVE = 2
+
+# WAL written before explicit ids: checkpoint size followed by raw float32 vectors
+LEGACY_WAL_HEADER = struct.Struct("<q")
+
+# IVF needs roughly this many training points per list for k-means to be useful
+IVF_POINTS_PER_LIST = 39
+# PQ trains 256 centroids per sub-quantizer
+PQ_MIN_TRAIN = 256
+
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
 class FaissVector:
-    def __init__(self, dim=512, index_file="faiss_index.bin"):
+    def __init__(self, dim=512, index_file="faiss_index.bin", checkpoint_interval=None, index_type=None, shared=None):
         self.dim = dim
         self.index_file = index_file
-        self.index = faiss.IndexFlatL2(self.dim)
-        self.load_index()
+        self.wal_file = f"{index_file}.wal"
+        self.version_file = f"{index_file}.version"
+        self.lock_file = f"{index_file}.lock"
+        # Full-precision vectors at offset id * dim * 4, used to re-rank compressed indexes
+        self.vector_file = f"{index_file}.vectors"
+        self.checkpoint_interval = checkpoint_interval or config.faiss_checkpoint_interval
+        self.index_type = index_type or config.faiss_index_type
+        # Shared mode maps the checkpoint read-only so all workers use the same page cache.
+        # Vectors added since the checkpoint live in a small in-memory delta index.
+        self.shared = config.faiss_mmap if shared is None else shared
+        self.pending = 0
+        self.next_id = 0
+        self.checkpoint_next_id = 0
+        self.wal_offset = 0
+        self.version = None
+        # Ids removed from IVF/HNSW or mapped indexes, filtered at search time until the next compaction
+        self.tombstones = set()
+        self.lock = threading.Lock()
+        self.index = self.create_index()
+        self.delta = None
+        with self.lock, self.file_lock():
+            self.load_index()
+
+    @contextmanager
+    def file_lock(self, exclusive=True):
+        # Serializes id allocation, WAL appends and checkpoints between processes, including
+        # several workers or a maintenance script running next to the server
+        with open(self.lock_file, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
 
-    def load_index(self):
+    def load_index(self, truncate=True):
+        # truncate is only set while holding the exclusive file lock, readers never write
         try:
-            self.index = faiss.read_index(self.index_file)
+            if self.shared:
+                self.index = faiss.read_index(self.index_file, MMAP_FLAGS)
+            else:
+                self.index = faiss.read_index(self.index_file)
         except Exception as e:
             print(f"Index file not found or failed to load. Creating a new index. Error: {e}")
-            self.index = faiss.IndexFlatL2(self.dim)
+            self.index = self.create_index()
+        self.tombstones = set()
+        self.delta = self.create_index("flat") if self.shared else None
+        if not isinstance(self.index, faiss.IndexIDMap2) or (self.index.ntotal == 0 and self.has_legacy_wal()):
+            self.migrate_legacy_index()
+            return
+        self.apply_search_params(self.index)
+        self.version = self.read_version()
+        self.next_id = self.max_id() + 1
+        self.checkpoint_next_id = self.next_id
+        self.wal_offset = 0
+        self.pending = 0
+        self.replay_wal(truncate)
 
-    def save_index(self):
+    def sync(self, exclusive=False):
+        # Picks up checkpoints and WAL records written by other processes
+        with self.file_lock(exclusive):
+            self.sync_locked(truncate=exclusive)
+
+    def sync_locked(self, truncate=True):
+        if self.read_version() != self.version:
+            self.load_index(truncate)
+            logger.info(f"Reloaded FAISS index {self.index_file} at version {self.version}")
+        else:
+            self.replay_wal(truncate)
+
+    def read_version(self):
         try:
-            faiss.write_index(self.index, self.index_file)
+            with open(self.version_file) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ""
+
+    def write_version(self):
+        tmp_file = f"{self.version_file}.tmp"
+        with open(tmp_file, "w") as f:
+            f.write(uuid4().hex)
+        os.replace(tmp_file, self.version_file)
+        self.version = self.read_version()
+
+    def writable_index(self):
+        return self.delta if self.shared else self.index
+
+    def base_index(self, index=None):
+        index = faiss.downcast_index(index if index is not None else self.index)
+        if isinstance(index, faiss.IndexIDMap):
+            index = faiss.downcast_index(index.index)
+        return index
+
+    def create_base_index(self, index_type=None, train_vectors=None):
+        index_type = index_type or self.index_type
+        if index_type == "flat":
+            return faiss.IndexFlatL2(self.dim)
+        if index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dim, config.faiss_hnsw_m)
+            index.hnsw.efConstruction = config.faiss_ef_construction
+            return index
+        if index_type in ("sq8", "pq"):
+            if train_vectors is None or len(train_vectors) < (PQ_MIN_TRAIN if index_type == "pq" else 1):
+                logger.warning(f"Not enough vectors to train a {index_type} index, using a flat index until the next rebuild")
+                return faiss.IndexFlatL2(self.dim)
+            if index_type == "sq8":
+                index = faiss.IndexScalarQuantizer(self.dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+            else:
+                index = faiss.IndexPQ(self.dim, config.faiss_pq_m, 8)
+            index.train(train_vectors)
+            return index
+        if index_type == "ivf":
+            nlist = min(config.faiss_nlist, len(train_vectors) // IVF_POINTS_PER_LIST) if train_vectors is not None else 0
+            if nlist < 1:
+                logger.warning("Not enough vectors to train an IVF index, using a flat index until the next rebuild")
+                return faiss.IndexFlatL2(self.dim)
+            quantizer = faiss.IndexFlatL2(self.dim)
+            index = faiss.IndexIVFFlat(quantizer, self.dim, nlist)
+            index.train(train_vectors)
+            return index
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+
+    def create_index(self, index_type=None, train_vectors=None):
+        return faiss.IndexIDMap2(self.create_base_index(index_type, train_vectors))
+
+    def apply_search_params(self, index, nprobe=None, ef_search=None):
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = nprobe or config.faiss_nprobe
+        hnsw = self.base_index(index)
+        if isinstance(hnsw, faiss.IndexHNSW):
+            hnsw.hnsw.efSearch = ef_search or config.faiss_ef_search
+
+    def supports_remove(self):
+        # IndexIDMap2 expects the wrapped index to shift ids on removal, which only flat
+        # code indexes (flat, SQ, PQ) do. A mapped checkpoint is read-only.
+        return not self.shared and isinstance(self.base_index(), faiss.IndexFlatCodes)
+
+    def is_lossy(self, index=None):
+        base = self.base_index(index)
+        ivf = faiss.try_extract_index_ivf(base)
+        if ivf is not None:
+            # try_extract_index_ivf returns the IndexIVF base class
+            return not isinstance(faiss.downcast_index(ivf), faiss.IndexIVFFlat)
+        return isinstance(base, (faiss.IndexScalarQuantizer, faiss.IndexPQ))
+
+    def store_vectors(self, ids, vectors):
+        if not len(ids):
+            return
+        record_size = self.dim * 4
+        with open(self.vector_file, "r+b" if os.path.exists(self.vector_file) else "wb") as f:
+            if ids[-1] - ids[0] + 1 == len(ids):
+                f.seek(int(ids[0]) * record_size)
+                f.write(np.ascontiguousarray(vectors, dtype='float32').tobytes())
+            else:
+                for id, vector in zip(ids, vectors):
+                    f.seek(int(id) * record_size)
+                    f.write(np.ascontiguousarray(vector, dtype='float32').tobytes())
+
+    def read_vectors(self, ids):
+        vectors = np.zeros((len(ids), self.dim), dtype='float32')
+        if not len(ids) or not os.path.exists(self.vector_file):
+            return vectors, np.zeros(len(ids), dtype=bool)
+        record_size = self.dim * 4
+        size = os.path.getsize(self.vector_file)
+        with open(self.vector_file, "rb") as f:
+            for i, id in enumerate(ids):
+                offset = int(id) * record_size
+                if offset + record_size <= size:
+                    vectors[i] = np.frombuffer(os.pread(f.fileno(), record_size, offset), dtype='float32')
+        # Holes left by ids that were never written read back as zeros, embeddings never are
+        return vectors, np.any(vectors != 0, axis=1)
+
+    def max_id(self):
+        if self.index.ntotal == 0:
+            return -1
+        return int(faiss.vector_to_array(self.index.id_map).max())
+
+    def migrate_legacy_index(self):
+        # Indexes written before explicit ids used the insertion position as faiss id
+        legacy = self.index if not isinstance(self.index, faiss.IndexIDMap2) else faiss.IndexFlatL2(self.dim)
+        if self.shared:
+            legacy = faiss.deserialize_index(faiss.serialize_index(legacy))
+        self.replay_legacy_wal(legacy)
+        vectors = legacy.reconstruct_n(0, legacy.ntotal) if legacy.ntotal else np.empty((0, self.dim), dtype='float32')
+        index = self.create_index(train_vectors=vectors)
+        if len(vectors):
+            index.add_with_ids(vectors, np.arange(len(vectors), dtype='int64'))
+        self.index = index
+        self.next_id = len(vectors)
+        self.write_checkpoint(index)
+        logger.info(f"Migrated FAISS index with {len(vectors)} vectors to explicit ids")
+
+    def has_legacy_wal(self):
+        if not os.path.exists(self.wal_file):
+            return False
+        with open(self.wal_file, "rb") as f:
+            header = f.read(len(WAL_MAGIC))
+        return len(header) == len(WAL_MAGIC) and header not in (WAL_MAGIC, WAL_MAGIC_V1)
+
+    def replay_legacy_wal(self, index):
+        if not self.has_legacy_wal():
+            return
+        with open(self.wal_file, "rb") as f:
+            data = f.read()
+        base, = LEGACY_WAL_HEADER.unpack_from(data)
+        record_size = self.dim * 4
+        count = (len(data) - LEGACY_WAL_HEADER.size) // record_size
+        vectors = np.frombuffer(data, dtype='float32', count=count * self.dim, offset=LEGACY_WAL_HEADER.size)
+        vectors = vectors.reshape(-1, self.dim)[max(index.ntotal - base, 0):]
+        if len(vectors):
+            index.add(vectors)
+
+    def replay_wal(self, truncate=True):
+        if not os.path.exists(self.wal_file):
+            if truncate:
+                self.reset_wal()
+            return
+        with open(self.wal_file, "rb") as f:
+            f.seek(self.wal_offset)
+            data = f.read()
+        if not data:
+            return
+
+        offset = 0
+        carried = 0
+        if self.wal_offset == 0:
+            if data.startswith(WAL_MAGIC) and len(data) >= WAL_HEADER.size:
+                _, next_id, carried = WAL_HEADER.unpack_from(data)
+                offset = WAL_HEADER.size
+            elif data.startswith(WAL_MAGIC_V1) and len(data) >= WAL_HEADER_V1.size:
+                _, next_id = WAL_HEADER_V1.unpack_from(data)
+                offset = WAL_HEADER_V1.size
+            else:
+                logger.warning(f"Ignoring unreadable WAL {self.wal_file}")
+                if truncate:
+                    self.reset_wal()
+                return
+            self.next_id = max(self.next_id, next_id)
+
+        # Adds below the checkpoint's next id are already in the index. Ids are never
+        # reused, so replaying the remaining records in order is idempotent.
+        record_size = self.dim * 4
+        ids, vectors = [], []
+        replayed = 0
+        while offset + WAL_RECORD.size <= len(data):
+            op, id = WAL_RECORD.unpack_from(data, offset)
+            if op == WAL_ADD:
+                if offset + WAL_RECORD.size + record_size > len(data):
+                    break
+                if id >= self.checkpoint_next_id:
+                    ids.append(id)
+                    vectors.append(np.frombuffer(data, dtype='float32', count=self.dim, offset=offset + WAL_RECORD.size))
+                self.next_id = max(self.next_id, id + 1)
+                offset += WAL_RECORD.size + record_size
+            elif op == WAL_REMOVE:
+                self.flush_replay(ids, vectors, truncate)
+                ids, vectors = [], []
+                self.remove_from_index(np.array([id], dtype='int64'))
+                offset += WAL_RECORD.size
+            else:
+                break
+            replayed += 1
+        self.flush_replay(ids, vectors, truncate)
+        self.wal_offset += offset
+
+        if offset < len(data) and truncate:
+            # A torn record from a crash is cut off so new records are not appended behind it
+            logger.warning(f"Truncating incomplete record at the end of {self.wal_file}")
+            os.truncate(self.wal_file, self.wal_offset)
+        if replayed:
+            logger.info(f"Replayed {replayed} records from {self.wal_file}")
+        # Tombstones carried over by the last checkpoint are not new work for the next one
+        self.pending += max(replayed - carried, 0)
+        if self.pending >= self.checkpoint_interval and truncate:
+            self.checkpoint()
+
+    def flush_replay(self, ids, vectors, store=True):
+        if ids:
+            ids, vectors = np.array(ids, dtype='int64'), np.stack(vectors)
+            self.writable_index().add_with_ids(vectors, ids)
+            # Readers in shared mode leave the vector file to the writer that appended the records
+            if store:
+                self.store_vectors(ids, vectors)
+
+    def reset_wal(self):
+        tmp_file = f"{self.wal_file}.tmp"
+        # Tombstones are not part of the checkpoint, so they are carried over
+        tombstones = sorted(self.tombstones)
+        data = WAL_HEADER.pack(WAL_MAGIC, self.next_id, len(tombstones)) + b"".join(WAL_RECORD.pack(WAL_REMOVE, id) for id in tombstones)
+        with open(tmp_file, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.wal_file)
+        self.wal_offset = len(data)
+        self.pending = 0
+
+    def save_index(self, index=None):
+        try:
+            tmp_file = f"{self.index_file}.tmp"
+            faiss.write_index(index if index is not None else self.index, tmp_file)
+            os.replace(tmp_file, self.index_file)
+            return True
         except Exception as e:
             print(f"Error saving index: {e}")
+            return False
+
+    def write_checkpoint(self, index):
+        # The WAL is only reset once the new checkpoint is safely in place
+        if not self.save_index(index):
+            return False
+        self.write_version()
+        self.reset_wal()
+        if self.shared:
+            self.load_index()
+        logger.info(f"FAISS checkpoint written with {index.ntotal} vectors")
+        return True
+
+    def checkpoint(self):
+        index = self.index
+        tombstones = self.tombstones
+        if self.shared:
+            # The mapped checkpoint is read-only, the next one is written from an owned copy
+            index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            ids, vectors = self.index_vectors(self.delta)
+            if len(ids):
+                index.add_with_ids(vectors, ids)
+            if tombstones and isinstance(self.base_index(index), faiss.IndexFlatCodes):
+                index.remove_ids(np.fromiter(tombstones, dtype='int64'))
+                tombstones = set()
+        previous, self.tombstones = self.tombstones, tombstones
+        if not self.write_checkpoint(index):
+            self.tombstones = previous
+            return
+        if len(self.tombstones) > self.index.ntotal // 5:
+            logger.warning(f"{len(self.tombstones)} of {self.index.ntotal} FAISS vectors are deleted, compaction recommended")
+
+    def append_wal(self, records):
+        with open(self.wal_file, "ab") as f:
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+        self.wal_offset += len(records)
+
+    def index_vectors(self, index):
+        if index.ntotal == 0:
+            return np.empty(0, dtype='int64'), np.empty((0, self.dim), dtype='float32')
+        base = self.base_index(index)
+        ivf = faiss.try_extract_index_ivf(base)
+        if ivf is not None:
+            ivf.make_direct_map()
+        return faiss.vector_to_array(index.id_map), base.reconstruct_n(0, index.ntotal)
+
+    def reconstruct_all(self):
+        ids, vectors = self.index_vectors(self.index)
+        if self.is_lossy() and len(ids):
+            # Prefer the stored full-precision vectors over compressed reconstructions
+            stored, found = self.read_vectors(ids)
+            vectors[found] = stored[found]
+        if self.delta is not None and self.delta.ntotal:
+            delta_ids, delta_vectors = self.index_vectors(self.delta)
+            ids, vectors = np.concatenate([ids, delta_ids]), np.concatenate([vectors, delta_vectors])
+        if self.tombstones:
+            alive = ~np.isin(ids, np.fromiter(self.tombstones, dtype='int64'))
+            ids, vectors = ids[alive], vectors[alive]
+        return ids, vectors
+
+    def rebuild(self, index_type=None):
+        # Vectors keep their ids, deleted ones are dropped
+        with self.lock, self.file_lock():
+            self.sync_locked()
+            ids, vectors = self.reconstruct_all()
+            if not self.is_lossy():
+                # Back-fill the vector file so a compressed index can be re-ranked exactly
+                self.store_vectors(ids, vectors)
+            index = self.create_index(index_type, vectors)
+            if len(vectors):
+                index.add_with_ids(vectors, ids)
+            self.apply_search_params(index)
+            self.index_type = index_type or self.index_type
+            previous, self.tombstones = self.tombstones, set()
+            if not self.write_checkpoint(index):
+                self.tombstones = previous
+            elif not self.shared:
+                self.index = index
+        logger.info(f"FAISS index rebuilt as {self.index_type} with {self.index.ntotal} vectors")
+
+    def compact(self):
+        self.rebuild()
 
     def add(self, embeddings):
-        embeddings = np.array(embeddings).astype('float32')
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
         if embeddings.ndim == 1:
             embeddings = embeddings.reshape(1, -1)
         if embeddings.shape[1] != self.dim:
             raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match index dimension {self.dim}")
-        self.index.add(embeddings)
-        self.save_index()
+        with self.lock, self.file_lock():
+            # Other workers may have allocated ids since the last sync
+            self.sync_locked()
+            ids = np.arange(self.next_id, self.next_id + len(embeddings), dtype='int64')
+            self.store_vectors(ids, embeddings)
+            self.append_wal(b"".join(
+                WAL_RECORD.pack(WAL_ADD, int(id)) + embedding.tobytes() for id, embedding in zip(ids, embeddings)
+            ))
+            self.writable_index().add_with_ids(embeddings, ids)
+            self.next_id += len(ids)
+            self.pending += len(ids)
+            if self.pending >= self.checkpoint_interval:
+                self.checkpoint()
+        return ids
+
+    def remove_from_index(self, ids):
+        if self.supports_remove():
+            return self.index.remove_ids(ids)
+        self.tombstones.update(int(id) for id in ids)
+        return len(ids)
 
-    def search(self, embedding, k=10, threshold=0.8):
-        if not isinstance(embedding, np.ndarray):
-            embedding = np.array(embedding, dtype='float32')
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype='int64').ravel()
+        if not len(ids):
+            return 0
+        with self.lock, self.file_lock():
+            self.sync_locked()
+            self.append_wal(b"".join(WAL_RECORD.pack(WAL_REMOVE, int(id)) for id in ids))
+            removed = self.remove_from_index(ids)
+            self.pending += len(ids)
+            if self.pending >= self.checkpoint_interval:
+                self.checkpoint()
+        return removed
+
+    def close(self):
+        with self.lock, self.file_lock():
+            self.sync_locked()
+            if self.pending:
+                self.checkpoint()
+
+    def prepare_query(self, embedding):
+        embedding = np.ascontiguousarray(embedding, dtype='float32')
         if embedding.ndim == 1:
             embedding = embedding.reshape(1, -1)
+        return embedding
 
-        distances, indices = self.index.search(embedding, self.index.ntotal)
+    def search_params(self, selector, index=None):
+        index = index if index is not None else self.index
+        ivf = faiss.try_extract_index_ivf(index)
+        hnsw = self.base_index(index)
+        if ivf is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+        elif isinstance(hnsw, faiss.IndexHNSW):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        # FAISS only keeps raw pointers, the Python objects must outlive the search
+        params.referenced_objects = [selector]
+        return params
 
-        filtered_distances = []
-        filtered_indices = []
+    def tombstone_selector(self):
+        deleted = np.fromiter(self.tombstones, dtype='int64')
+        batch = faiss.IDSelectorBatch(len(deleted), faiss.swig_ptr(deleted))
+        selector = faiss.IDSelectorNot(batch)
+        selector.referenced_objects = [batch, deleted]
+        return selector
 
-        for distance, index in zip(distances[0], indices[0]):
-            if distance < threshold:
-                filtered_distances.append(distance)
-                filtered_indices.append(index)
-                if len(filtered_distances) >= k:
-                    break
+    def range_search_index(self, index, embeddings, threshold, selector):
+        # One FAISS call for all queries, lims splits the flat result per query
+        if selector is not None:
+            lims, distances, indices = index.range_search(embeddings, threshold, params=self.search_params(selector, index))
+        else:
+            lims, distances, indices = index.range_search(embeddings, threshold)
+        return [(distances[lims[i]:lims[i + 1]], indices[lims[i]:lims[i + 1]]) for i in range(len(embeddings))]
+
+    def rerank(self, embedding, distances, indices):
+        # Compressed distances only pick the candidates, the stored vectors decide the order
+        valid = indices >= 0
+        ids, approximate = indices[valid], distances[valid]
+        vectors, found = self.read_vectors(ids)
+        exact = np.where(found, np.sum((vectors - embedding) ** 2, axis=1), approximate)
+        order = np.argsort(exact, kind='stable')
+        return exact[order].astype('float32'), ids[order]
+
+    def range_search_batch(self, embeddings, threshold=0.8):
+        # Every neighbour closer than the threshold for each query, sorted by distance
+        embeddings = self.prepare_query(embeddings)
+        with self.lock:
+            self.sync()
+            rerank = self.is_lossy() and config.faiss_rerank_margin > 0
+            # Compressed distances are approximate, a wider radius keeps the true matches that
+            # land just outside the threshold so the exact distances can decide
+            radius = threshold * (1 + config.faiss_rerank_margin) if rerank else threshold
+            # Deleted ids still in IVF/HNSW or mapped indexes are filtered out
+            selector = self.tombstone_selector() if self.tombstones else None
+            results = self.range_search_index(self.index, embeddings, radius, selector)
+            if self.delta is not None and self.delta.ntotal:
+                delta_results = self.range_search_index(self.delta, embeddings, radius, selector)
+                results = [
+                    (np.concatenate([distances, delta_distances]), np.concatenate([indices, delta_indices]))
+                    for (distances, indices), (delta_distances, delta_indices) in zip(results, delta_results)
+                ]
+
+        sorted_results = []
+        for embedding, (distances, indices) in zip(embeddings, results):
+            if rerank:
+                distances, indices = self.rerank(embedding, distances, indices)
+                mask = distances < threshold
+                sorted_results.append((distances[mask], indices[mask]))
+            else:
+                order = np.argsort(distances, kind='stable')
+                sorted_results.append((distances[order], indices[order]))
+        return sorted_results
+
+    def range_search(self, embedding, threshold=0.8):
+        return self.range_search_batch(embedding, threshold)[0]
+
+faiss_vectors = {}
+faiss_vectors_lock = threading.Lock()
 
-        return np.array(filtered_distances), np.array(filtered_indices)
\ No newline at end of file
+def get_faiss_vector(index_file="faiss_index.bin") -> FaissVector:
+    # Each index file has a single FaissVector per process, it owns the WAL appends
+    with faiss_vectors_lock:
+        if index_file not in faiss_vectors:
+            faiss_vectors[index_file] = FaissVector(index_file=index_file)
+        return faiss_vectors[index_file]
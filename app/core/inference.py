@@ -0,0 +1,135 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import config
+from app.core.logger import logger
+
+# Model modules are imported inside the worker functions so the API process only loads
+# TensorFlow and MTCNN when inference runs inline.
+
+def load_models():
+    import app.core.detector
+    from app.core.facenet import get_facenet_model
+    get_facenet_model()
+    return True
+
+def detect(data: bytes):
+    from app.core.detector import face_detector
+    return [box for _, box in face_detector.detect_faces(data)]
+
+def detect_and_embed(data: bytes):
+    from app.core.detector import face_detector
+    from app.core.facenet import get_facenet_model
+    detected_faces = face_detector.detect_faces(data)
+    embeddings = get_facenet_model().get_embeddings_batch([face for face, _ in detected_faces])
+    return [box for _, box in detected_faces], embeddings
+
+
+class InferenceDisabled(RuntimeError):
+    pass
+
+
+class InferenceExecutor:
+    def __init__(self, workers=2, enabled=True):
+        self.workers = workers
+        self.enabled = enabled
+        self.pool = None
+        self.lock = threading.Lock()
+        # not_loaded until the first job or start(), then loading and ready or failed
+        self.state = "not_loaded" if enabled else "disabled"
+        self.error = None
+
+    def start(self):
+        # Loads the models ahead of the first request
+        if not self.enabled or self.state != "not_loaded":
+            return
+        if self.workers:
+            self.executor()
+        else:
+            threading.Thread(target=self.warm_up, name="inference-warm-up", daemon=True).start()
+
+    def warm_up(self):
+        self.state = "loading"
+        try:
+            load_models()
+            self.loaded()
+        except Exception as e:
+            self.failed(e)
+
+    def loaded(self, future: Future = None):
+        if future is not None and future.exception() is not None:
+            return self.failed(future.exception())
+        self.state = "ready"
+        self.error = None
+        logger.info("Inference models loaded")
+
+    def failed(self, error):
+        self.state = "failed"
+        self.error = str(error)
+        logger.error(f"Loading inference models failed: {error}")
+
+    def status(self):
+        return {"models": self.state, "workers": self.workers, "error": self.error}
+
+    def executor(self):
+        with self.lock:
+            if self.pool is None:
+                # TensorFlow is not fork-safe, workers are spawned and load the models once
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=load_models
+                )
+                logger.info(f"Started inference pool with {self.workers} workers")
+                self.state = "loading"
+                self.pool.submit(load_models).add_done_callback(self.loaded)
+            return self.pool
+
+    def submit(self, fn, *args) -> Future:
+        if not self.enabled:
+            raise InferenceDisabled("Face inference is disabled on this worker")
+        if not self.workers:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+                if self.state != "ready":
+                    self.loaded()
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        try:
+            return self.executor().submit(fn, *args)
+        except BrokenProcessPool:
+            self.reset()
+            return self.executor().submit(fn, *args)
+
+    def call(self, fn, *args):
+        try:
+            return self.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (usually out of memory), the next job starts a fresh pool
+            logger.error("Inference worker died, restarting the pool")
+            self.reset()
+            raise
+
+    def detect(self, data: bytes):
+        return self.call(detect, data)
+
+    def detect_and_embed(self, data: bytes):
+        return self.call(detect_and_embed, data)
+
+    def reset(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown()
+
+inference_executor = InferenceExecutor(config.inference_workers, enabled=config.app_mode != "api-only")
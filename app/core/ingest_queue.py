@@ -0,0 +1,42 @@
+import queue
+import threading
+
+from app.core.config import config
+from app.core.logger import logger
+
+
+class IngestQueue:
+    def __init__(self, workers=2, max_size=100):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.workers = []
+        for i in range(workers):
+            worker = threading.Thread(target=self.run, name=f"ingest-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    @property
+    def capacity(self):
+        return self.queue.maxsize
+
+    def full(self):
+        return self.queue.full()
+
+    def submit(self, fn, *args):
+        self.queue.put_nowait((fn, args))
+        logger.info(f"Ingest queue depth: {self.depth}/{self.capacity}")
+
+    def run(self):
+        while True:
+            fn, args = self.queue.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Ingest worker error: {e}")
+            finally:
+                self.queue.task_done()
+
+ingest_queue = IngestQueue(config.ingest_workers, config.ingest_queue_size)
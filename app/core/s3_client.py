@@ -1,14 +1,15 @@
-from datetime import datetime, timedelta
-from venv import logger
-
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
-from botocore.signers import generate_presigned_url
 from app.core.config import config
+from app.core.storage import StorageBackend
+
 
+class S3Client(StorageBackend):
+    name = "s3"
 
-class S3Client:
     def __init__(self):
+        super().__init__()
         self.s3 = boto3.client(
             "s3",
             aws_access_key_id = config.aws_access_key_id,
@@ -17,32 +18,28 @@ class S3Client:
             endpoint_url = config.aws_url,
             config = Config(signature_version="s3v4")
         )
-        self.cache = {}
+        part_size = config.s3_part_size_mb * 1024 * 1024
+        self.transfer_config = TransferConfig(
+            multipart_threshold = part_size,
+            multipart_chunksize = part_size,
+            max_concurrency = max(config.s3_upload_concurrency, 1),
+            use_threads = config.s3_upload_concurrency > 1
+        )
 
-    def upload_file(self, file, bucket_name, path):
-        self.s3.upload_fileobj(file, bucket_name, path)
+    def url(self, path: str) -> str:
+        return f"{config.aws_url}{path}"
 
-    def generate_presigned_url(self, bucket_name, path, expiration=3600):
-        cache_key = f"{bucket_name}/{path}"
-        if cache_key in self.cache:
-            url, expiry_time = self.cache[cache_key]
-            if datetime.now() < expiry_time:
-                return url
+    def upload_file(self, file, bucket_name, path, extra_args=None):
+        # Files are streamed part by part from their current position, pass the spooled
+        # UploadFile.file instead of reading it into memory first
+        self.s3.upload_fileobj(file, bucket_name, path, ExtraArgs=extra_args, Config=self.transfer_config)
 
-        url = self.s3.generate_presigned_url(
+    def sign(self, bucket_name, path, expiration) -> str:
+        return self.s3.generate_presigned_url(
             ClientMethod="get_object",
             Params={"Bucket": bucket_name, "Key": path},
             ExpiresIn=expiration
         )
-        expiry_time = datetime.now() + timedelta(seconds=expiration)
-        self.cache[cache_key] = (url, expiry_time)
-        return url
-
-    def get_object(self, bucket_name, path):
-        url = self.generate_presigned_url(bucket_name, path)
-        return url
 
     def download_file(self, bucket_name, path, file):
         self.s3.download_fileobj(bucket_name, path, file)
-
-s3_client = S3Client()
\ No newline at end of file
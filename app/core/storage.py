@@ -0,0 +1,135 @@
+import hashlib
+import hmac
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import BinaryIO, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote, urlparse
+
+from app.core.config import config
+from app.core.lru_cache import LRUCache
+
+
+class StorageBackend:
+    name = "base"
+
+    def __init__(self):
+        self.cache = LRUCache(config.presign_cache_size)
+        self.upload_pool = ThreadPoolExecutor(max_workers=max(config.s3_upload_workers, 1), thread_name_prefix="storage-upload")
+
+    def url(self, path: str) -> str:
+        # URL stored in documents, object_key maps it back to the path
+        raise NotImplementedError
+
+    def upload_file(self, file, bucket_name, path, extra_args=None):
+        raise NotImplementedError
+
+    def download_file(self, bucket_name, path, file):
+        raise NotImplementedError
+
+    def sign(self, bucket_name, path, expiration) -> str:
+        raise NotImplementedError
+
+    def upload_many(self, uploads: Iterable[Tuple[BinaryIO, str]], bucket_name=None, extra_args=None):
+        # Uploads (file, path) pairs concurrently on the shared pool and waits for all of them,
+        # the first error is raised once every upload has finished
+        bucket_name = bucket_name or config.aws_bucket
+        futures = [self.upload_pool.submit(self.upload_file, file, bucket_name, path, extra_args) for file, path in uploads]
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def generate_presigned_url(self, bucket_name, path, expiration=3600):
+        cache_key = f"{bucket_name}/{path}"
+        url = self.cache.get(cache_key)
+        if url is not None:
+            return url
+
+        url = self.sign(bucket_name, path, expiration)
+        # Cached URLs are dropped a margin before they expire, so clients always get time to use them
+        self.cache.set(cache_key, url, ttl=max(expiration - config.presign_margin_seconds, 0))
+        return url
+
+    def presign_many(self, paths: List[Optional[str]], bucket_name=None, expiration=3600) -> List[Optional[str]]:
+        # Signs a whole page at once, each distinct key is looked up or signed only once
+        bucket_name = bucket_name or config.aws_bucket
+        urls = {path: self.generate_presigned_url(bucket_name, path, expiration) for path in set(paths) if path}
+        return [urls.get(path) for path in paths]
+
+    def presign_urls(self, urls: List[Optional[str]], bucket_name=None, expiration=3600) -> List[Optional[str]]:
+        return self.presign_many([self.object_key(url) if url else None for url in urls], bucket_name, expiration)
+
+    def object_key(self, url: str) -> str:
+        return urlparse(url).path.lstrip("/")
+
+    def get_object(self, bucket_name, path):
+        url = self.generate_presigned_url(bucket_name, path)
+        return url
+
+
+class LocalStorage(StorageBackend):
+    name = "local"
+
+    def __init__(self, root=None, base_url=None):
+        super().__init__()
+        self.root = os.path.abspath(root or config.local_storage_root)
+        self.base_url = base_url or config.local_storage_url or f"{config.app_url.rstrip('/')}/media/"
+        if not config.local_storage_signing_key:
+            raise ValueError("LOCAL_STORAGE_SIGNING_KEY is required by the local storage backend")
+        self.secret = config.local_storage_signing_key.encode()
+
+    def file_path(self, path: str) -> str:
+        full_path = os.path.abspath(os.path.join(self.root, path))
+        if os.path.commonpath([self.root, full_path]) != self.root:
+            raise ValueError(f"Invalid storage path: {path}")
+        return full_path
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def object_key(self, url: str) -> str:
+        path = unquote(urlparse(url).path)
+        prefix = urlparse(self.base_url).path
+        return (path[len(prefix):] if path.startswith(prefix) else path).lstrip("/")
+
+    def upload_file(self, file, bucket_name, path, extra_args=None):
+        # Written to a temporary file and renamed, nginx never serves a partial file
+        full_path = self.file_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as output:
+                shutil.copyfileobj(file, output)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def download_file(self, bucket_name, path, file):
+        with open(self.file_path(path), "rb") as source:
+            shutil.copyfileobj(source, file)
+
+    def signature(self, path: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{path}:{expires}".encode(), hashlib.sha256).hexdigest()
+
+    def sign(self, bucket_name, path, expiration) -> str:
+        expires = int(time.time()) + expiration
+        return f"{self.base_url}{quote(path)}?expires={expires}&signature={self.signature(path, expires)}"
+
+    def verify(self, path: str, expires: int, signature: str) -> bool:
+        return expires >= time.time() and hmac.compare_digest(self.signature(path, expires), signature)
+
+
+def create_storage_backend(backend=None) -> StorageBackend:
+    backend = backend or config.storage_backend
+    if backend == "local":
+        return LocalStorage()
+    if backend == "s3":
+        from app.core.s3_client import S3Client
+        return S3Client()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+storage = create_storage_backend()
@@ -1,41 +1,96 @@
-from io import BytesIO
-from typing import Final, List, Tuple
+from functools import lru_cache
+from typing import Final, Iterator, List, Tuple, Union
 import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 from fastapi import UploadFile
 
 text: Final[str] = "Find Me"
-font_size: Final[int] = 300
-font = ImageFont.truetype('Poppins-Medium.ttf', font_size)
-
-def create_watermark(image: UploadFile, boxes: List[Tuple[int, int, int, int]]):
-    image = Image.open(BytesIO(image.file.read()), mode='r')
-    # Create a new RGBA image for the watermark with the same size as the input image
-    watermark = Image.new('RGBA', image.size, (0, 0, 0, 0))
-    draw = ImageDraw.Draw(watermark)
-
-    # Calculate a proportional font size based on the image dimensions
-    proportional_font_size = min(image.width, image.height) // 5  # Adjusted divisor for larger font size
-    font = ImageFont.truetype('Poppins-Medium.ttf', proportional_font_size)
-
-    # Calculate the size of the text
-    text_bbox = draw.textbbox((0, 0), text, font=font)
-    text_width = text_bbox[2] - text_bbox[0]
-    text_height = text_bbox[3] - text_bbox[1]
-
-    # Calculate the position for the text to be centered
-    x = (image.width - text_width) // 2
-    y = (image.height - text_height) // 2
-
-    # Draw the text on the watermark image
-    soft_grey = (200, 200, 200, 128)
-    draw.text((x, y), text, font=font, fill=soft_grey)
-
-    # Draw yellow bounding boxes around detected faces
-    yellow = (255, 255, 0, 128)
-    for (x, y, width, height) in boxes:
-        draw.rectangle([x, y, x + width, y + height], outline=yellow, width=5)
-
-    # Combine the watermark with the original image
-    watermark_image = Image.alpha_composite(image.convert('RGBA'), watermark)
-    return np.array(watermark_image.convert('RGB'))
\ No newline at end of file
+
+soft_grey: Final[Tuple[int, int, int, int]] = (200, 200, 200, 128)
+yellow: Final[Tuple[int, int, int, int]] = (255, 255, 0, 128)
+box_width: Final[int] = 5
+
+Box = Tuple[int, int, int, int]
+
+class WatermarkEngine:
+    def __init__(self, font_path='Poppins-Medium.ttf', cache_size=8):
+        self.font_path = font_path
+        # Only the text patch is cached, keyed by font size. Photos from the same camera share
+        # a font size in both orientations, and a patch is a fraction of a full-size layer.
+        self.font = lru_cache(maxsize=cache_size)(self.load_font)
+        self.text_patch = lru_cache(maxsize=cache_size)(self.create_text_patch)
+
+    def load_font(self, size: int):
+        return ImageFont.truetype(self.font_path, size)
+
+    def create_text_patch(self, font_size: int):
+        # The text cropped to its bounding box, with the bbox origin to place it
+        font = self.font(font_size)
+        left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox((0, 0), text, font=font)
+        patch = Image.new('RGBA', (max(right - left, 1), max(bottom - top, 1)), (0, 0, 0, 0))
+        ImageDraw.Draw(patch).text((-left, -top), text, font=font, fill=soft_grey)
+        return patch, (left, top)
+
+    def text_placement(self, size: Tuple[int, int]):
+        width, height = size
+        # Calculate a proportional font size based on the image dimensions
+        patch, (left, top) = self.text_patch(max(min(width, height) // 5, 1))
+        # The text is centered on the image
+        return patch, ((width - patch.width) // 2 + left, (height - patch.height) // 2 + top)
+
+    def composite_text(self, image: Image.Image, paste=False):
+        # Blends (or pastes, on a transparent overlay) the text patch clipped to the image
+        patch, (x, y) = self.text_placement(image.size)
+        left, top = max(x, 0), max(y, 0)
+        right, bottom = min(x + patch.width, image.width), min(y + patch.height, image.height)
+        if right <= left or bottom <= top:
+            return
+        region = patch.crop((left - x, top - y, right - x, bottom - y))
+        if paste:
+            image.paste(region, (left, top))
+        else:
+            image.alpha_composite(region, (left, top))
+
+    def open(self, image: Union[UploadFile, Image.Image, np.ndarray]) -> Image.Image:
+        if isinstance(image, np.ndarray):
+            return Image.fromarray(image)
+        if isinstance(image, Image.Image):
+            return image
+        return Image.open(image.file, mode='r')
+
+    def base(self, image: Image.Image) -> Image.Image:
+        base = image.convert('RGBA')
+        self.composite_text(base)
+        return base
+
+    def draw_boxes(self, image: Image.Image, boxes: List[Box]):
+        draw = ImageDraw.Draw(image)
+        for (x, y, width, height) in boxes:
+            draw.rectangle([x, y, x + width, y + height], outline=yellow, width=box_width)
+
+    def render(self, image, boxes: List[Box]) -> Image.Image:
+        image = self.open(image)
+        overlay = Image.new('RGBA', image.size, (0, 0, 0, 0))
+        self.composite_text(overlay, paste=True)
+        self.draw_boxes(overlay, boxes)
+        return Image.alpha_composite(image.convert('RGBA'), overlay).convert('RGB')
+
+    def previews(self, image, boxes: List[Box]) -> Iterator[Image.Image]:
+        # The photo is decoded and composited with the text once. Each preview copies that
+        # result and only blends its own box region.
+        image = self.open(image)
+        base = self.base(image)
+        base_rgb = base.convert('RGB')
+        for (x, y, width, height) in boxes:
+            left, top = max(x - box_width, 0), max(y - box_width, 0)
+            right, bottom = min(x + width + box_width + 1, image.width), min(y + height + box_width + 1, image.height)
+            preview = base_rgb.copy()
+            if right > left and bottom > top:
+                region = base.crop((left, top, right, bottom))
+                overlay = Image.new('RGBA', region.size, (0, 0, 0, 0))
+                self.draw_boxes(overlay, [(x - left, y - top, width, height)])
+                region.alpha_composite(overlay)
+                preview.paste(region.convert('RGB'), (left, top))
+            yield preview
+
+watermark_engine = WatermarkEngine()
@@ -4,7 +4,7 @@ from app.core.logger import logger
 from app.schema.base_schema import WebResponse
 from app.schema.photo_schema import AddSellPhotoRequest, AddPostPhotoRequest, GetPhotoRequest, UpdateSellPhotoRequest, \
     SellPhotoResponse, PostPhotoResponse, UpdatePostPhotoRequest, DeletePhotoRequest, LikePhotoPostRequest, \
-    ListPhotoRequest, CollectionPhotoRequest, SamplePhotoRequest
+    ListPhotoRequest, CollectionPhotoRequest, SamplePhotoRequest, IngestJobResponse, GetIngestJobRequest, FindMeRequest
 from app.service.photo_service import PhotoService
 
 
@@ -16,6 +16,14 @@ class PhotoController:
         photo = self.photo_service.add_sell_photo(request, file)
         return WebResponse(data=photo.dict(by_alias=True))
 
+    def ingest_sell_photo(self, request: AddSellPhotoRequest, file: UploadFile) -> WebResponse[IngestJobResponse]:
+        job = self.photo_service.ingest_sell_photo(request, file)
+        return WebResponse(data=job.dict(by_alias=True))
+
+    def get_job(self, request: GetIngestJobRequest) -> WebResponse[IngestJobResponse]:
+        job = self.photo_service.get_job(request)
+        return WebResponse(data=job.dict(by_alias=True))
+
     def add_post_photo(self, request: AddPostPhotoRequest, file: UploadFile) -> WebResponse[dict]:
         photo = self.photo_service.add_post_photo(request, file)
         return WebResponse(data=photo.dict(by_alias=True))
@@ -52,6 +60,6 @@ class PhotoController:
         photos, total = self.photo_service.collection_photos(request)
         return {"data": photos, "total": total}
 
-    def findme(self, user_id: str):
-        photos = self.photo_service.findme(user_id)
-        return WebResponse(data=photos)
\ No newline at end of file
+    def findme(self, request: FindMeRequest):
+        photos, total = self.photo_service.findme(request)
+        return {"data": photos, "total": total}
\ No newline at end of file
@@ -3,6 +3,7 @@ from typing import List
 from app.core.logger import logger
 
 from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
+from starlette.concurrency import run_in_threadpool
 from starlette.status import HTTP_201_CREATED, HTTP_200_OK
 
 from app.http.controller.face_controller import FaceController
@@ -25,7 +26,7 @@ def get_face_router():
             raise HTTPException(status_code=400, detail="Invalid user ID")
         try:
             data = AddFaceRequest(**request.dict(exclude={"file"}), file=request.file)
-            return face_controller.add(data, request.file)
+            return await run_in_threadpool(face_controller.add, data, request.file)
         except HTTPException as err:
             logger.error(f"Error during add face: {err.detail}")
             raise HTTPException(detail=err.detail, status_code=err.status_code)
@@ -60,7 +61,7 @@ def get_face_router():
     @face_router.post("/detect", response_model=WebResponse[bool], status_code=HTTP_200_OK)
     async def detect_face(file: UploadFile = File(...)):
         try:
-            return face_controller.detect_face(file)
+            return await run_in_threadpool(face_controller.detect_face, file)
         except HTTPException as err:
             logger.error(f"Error during detect face: {err.detail}")
             raise HTTPException(detail=err.detail, status_code=err.status_code)
@@ -0,0 +1,32 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, Response
+
+from app.core.config import config
+from app.core.storage import storage
+
+
+def get_media_router():
+    media_router = APIRouter()
+
+    @media_router.get("/{path:path}")
+    async def get_media(path: str, expires: int, signature: str):
+        # Signed URLs stand in for S3 presigned URLs, the bytes are sent by nginx when
+        # LOCAL_STORAGE_ACCEL_PREFIX points at an internal location over the same directory
+        if not storage.verify(path, expires, signature):
+            raise HTTPException(status_code=403, detail="Invalid or expired signature")
+        try:
+            file_path = storage.file_path(path)
+        except ValueError:
+            raise HTTPException(status_code=403, detail="Invalid path")
+        if not os.path.isfile(file_path):
+            raise HTTPException(status_code=404, detail="File not found")
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if config.local_storage_accel_prefix:
+            return Response(headers={"X-Accel-Redirect": f"{config.local_storage_accel_prefix}{quote(path)}"}, media_type=media_type)
+        return FileResponse(file_path, media_type=media_type)
+
+    return media_router
@@ -3,14 +3,15 @@ import math
 from fastapi import APIRouter, Body, File, UploadFile, HTTPException, Form, Request
 from fastapi.params import Depends
 from typing import List
-from starlette.status import HTTP_201_CREATED
+from starlette.concurrency import run_in_threadpool
+from starlette.status import HTTP_201_CREATED, HTTP_202_ACCEPTED
 from app.core.logger import logger
 from app.http.controller.photo_controller import PhotoController
 from app.http.middleware.auth import get_current_user
 from app.schema.base_schema import WebResponse
 from app.schema.photo_schema import SellPhotoResponse, AddSellPhotoRequest, AddPostPhotoRequest, PostPhotoResponse, \
     GetPhotoRequest, UpdatePostPhotoRequest, UpdateSellPhotoRequest, LikePhotoPostRequest, ListPhotoRequest, \
-    CollectionPhotoRequest, DeletePhotoRequest, SamplePhotoRequest
+    CollectionPhotoRequest, DeletePhotoRequest, SamplePhotoRequest, IngestJobResponse, GetIngestJobRequest, FindMeRequest
 
 
 def get_photo_router():
@@ -27,22 +28,46 @@ def get_photo_router():
             raise HTTPException(status_code=400, detail="Invalid user ID")
         try:
             data = AddSellPhotoRequest(**request.dict(exclude={"file"}), file=request.file)
-            return photo_controller.add_sell_photo(data, request.file)
+            # Inference runs in the process pool, the event loop keeps serving other requests
+            return await run_in_threadpool(photo_controller.add_sell_photo, data, request.file)
         except HTTPException as err:
             logger.error(f"Error during add sell photo: {err.detail}")
             raise HTTPException(detail=err.detail, status_code=err.status_code)
 
+    @photo_router.post("/sell/ingest", response_model=WebResponse[IngestJobResponse], status_code=HTTP_202_ACCEPTED)
+    async def ingest_sell_photo(request: AddSellPhotoRequest = Depends(AddSellPhotoRequest.as_form), current_user: str = Depends(get_current_user)):
+        if current_user:
+            request.user_id = current_user
+        else:
+            raise HTTPException(status_code=400, detail="Invalid user ID")
+        try:
+            data = AddSellPhotoRequest(**request.dict(exclude={"file"}), file=request.file)
+            # The original is stored before responding, off the event loop
+            return await run_in_threadpool(photo_controller.ingest_sell_photo, data, request.file)
+        except HTTPException as err:
+            logger.error(f"Error during ingest sell photo: {err.detail}")
+            raise HTTPException(detail=err.detail, status_code=err.status_code)
+
+    @photo_router.get("/jobs/{id}", response_model=WebResponse[IngestJobResponse])
+    async def get_job(id, current_user: str = Depends(get_current_user)):
+        request = GetIngestJobRequest(id=id, user_id=current_user)
+        try:
+            return photo_controller.get_job(request)
+        except HTTPException as err:
+            logger.error(f"Error during get ingest job: {err.detail}")
+            raise HTTPException(detail=err.detail, status_code=err.status_code)
+
     @photo_router.post("/post", response_model=WebResponse[PostPhotoResponse], status_code=HTTP_201_CREATED)
     async def add_post_photo(request: AddPostPhotoRequest = Depends(AddPostPhotoRequest.as_form),
                              current_user: str = Depends(get_current_user)):
-        await request.file.read()
+        # The upload stays in its spooled file and is streamed to S3
         if current_user:
             request.user_id = current_user
         else:
             raise HTTPException(status_code=400, detail="Invalid user ID")
         try:
             data = AddPostPhotoRequest(**request.dict(exclude={"file"}), file=request.file)
-            return photo_controller.add_post_photo(data, request.file)
+            return await run_in_threadpool(photo_controller.add_post_photo, data, request.file)
         except HTTPException as err:
             logger.error(f"Error during add post photo: {err.detail}")
             raise HTTPException(detail=err.detail, status_code=err.status_code)
@@ -164,9 +189,20 @@ def get_photo_router():
             raise HTTPException(detail=err.detail, status_code=err.status_code)
 
     @photo_router.get("/sell/findme", response_model=WebResponse[List[SellPhotoResponse]])
-    async def findme(current_user: str = Depends(get_current_user)):
+    async def findme(request: Request, current_user: str = Depends(get_current_user)):
+        page = request.query_params.get("page", 1)
+        size = request.query_params.get("size", 10)
+        data = FindMeRequest(user_id=current_user, page=int(page), size=int(size))
         try:
-            return photo_controller.findme(current_user)
+            result = await run_in_threadpool(photo_controller.findme, data)
+            total = result["total"]
+            paging = {
+                "page": data.page,
+                "size": data.size,
+                "total_item": total,
+                "total_page": int(math.ceil(total / data.size))
+            }
+            return WebResponse(data=result["data"], paging=paging)
         except HTTPException as err:
             logger.error(f"Error during find me: {err.detail}")
             raise HTTPException(detail=err.detail, status_code=err.status_code)
@@ -92,7 +92,6 @@ def get_user_router():
     @user_router.patch("/change_profile", response_model= WebResponse[UserResponse], status_code=HTTP_200_OK)
     async def change_profile(file: UploadFile = File(...), current_user: str = Depends(get_current_user)):
         logger.info(f"Current user: {current_user}")
-        await file.read()
         if current_user:
             request = ChangePhotoRequest(id=current_user, photo=file.filename)
         else:
@@ -10,7 +10,10 @@ from app.http.route.photo_route import get_photo_router
 from app.http.route.transaction_route import get_transaction_router
 from app.http.route.user_route import get_user_router
 from app.http.route.face_route import get_face_router
+from app.http.route.media_route import get_media_router
 from app.core.config import config
+from app.core.inference import inference_executor
+from app.core.storage import storage
 import uvicorn
 
 from app.http.route.withdrawal_route import get_withdrawal_router
@@ -30,6 +33,21 @@ origins = [
 def index(request: Request):
     return JSONResponse(content={"message": "DIS Service is running"})
 
+@app.get("/ready")
+def ready():
+    status = {"mode": config.app_mode, **inference_executor.status(), "storage": storage.name, "presign_cache": storage.cache.stats()}
+    status_code = 503 if status["models"] in ("loading", "failed") else 200
+    return JSONResponse(content=status, status_code=status_code)
+
+@app.on_event("startup")
+def startup():
+    if config.inference_preload:
+        inference_executor.start()
+
+@app.on_event("shutdown")
+def shutdown():
+    inference_executor.shutdown()
+
 app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 app.add_exception_handler(HTTPException, http_exception_handler)
@@ -40,6 +58,8 @@ app.include_router(get_face_router(), prefix="/api/face", tags=["Face"])
 app.include_router(get_cart_routes(), prefix="/api/cart", tags=["Cart"])
 app.include_router(get_transaction_router(), prefix="/api/transaction", tags=["Transaction"])
 app.include_router(get_withdrawal_router(), prefix="/api/withdrawal", tags=["Withdrawal"])
+if config.storage_backend == "local":
+    app.include_router(get_media_router(), prefix="/media", tags=["Media"])
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
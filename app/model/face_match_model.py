@@ -0,0 +1,13 @@
+from bson import ObjectId
+
+from app.model.base_model import Base
+from app.model.photo_model import StatusSellPhoto
+
+class FaceMatch(Base):
+    user_id: ObjectId
+    face_id: ObjectId
+    photo_id: ObjectId
+    faiss_id: int
+    distance: float
+    # Copy of the photo status, kept in sync so findme filters and pages without joining photos
+    status: str = StatusSellPhoto.AVAILABLE
@@ -1,9 +1,21 @@
+import numpy as np
 from bson import ObjectId
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from typing import Optional
 
 from app.model.base_model import Base
 
+def encode_embeddings(value) -> bytes:
+    if isinstance(value, bytes):
+        return value
+    return np.asarray(value, dtype='float32').tobytes()
+
+def decode_embeddings(value) -> np.ndarray:
+    # Older documents store the embedding as a (nested) list of floats
+    if isinstance(value, bytes):
+        return np.frombuffer(value, dtype='float32')
+    return np.asarray(value, dtype='float32').reshape(-1)
+
 class BoundBox(BaseModel):
     x: float
     y: float
@@ -11,12 +23,16 @@ class BoundBox(BaseModel):
     height: float
 
 class Detections(BaseModel):
-    embeddings: list = []
+    embeddings: bytes = b""
     box: BoundBox
     faiss_id: Optional[int] = None
     url: Optional[str] = None
 
+    @validator('embeddings', pre=True)
+    def validate_embeddings(cls, v):
+        return encode_embeddings(v)
+
 class Face(Base):
     url: str
     detections: list[Detections] = []
-    user_id: ObjectId
\ No newline at end of file
+    user_id: ObjectId
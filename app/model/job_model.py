@@ -0,0 +1,19 @@
+from enum import Enum
+from typing import Optional
+
+from bson import ObjectId
+
+from app.model.base_model import Base
+
+class IngestStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+class IngestJob(Base):
+    user_id: ObjectId
+    url: str
+    status: IngestStatus = IngestStatus.QUEUED
+    photo_id: Optional[ObjectId] = None
+    error: Optional[str] = None
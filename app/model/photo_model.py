@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 from bson import ObjectId, Decimal128
 from decimal import Decimal
@@ -25,6 +25,8 @@ class SellPhoto(Base):
     user_id: ObjectId
     buyer_id: Optional[ObjectId] = Field(None, alias="buyer_id")
     detections: list[Detections] = []
+    # Rendition size -> URL, empty for photos uploaded before renditions existed
+    derivatives: Dict[str, str] = {}
 
 class Comment(Base):
     content: str
@@ -37,4 +39,5 @@ class PostPhoto(Base):
     type: str = "post"
     likes: List = []
     comments: List[Comment] = []
-    user_id: ObjectId
\ No newline at end of file
+    user_id: ObjectId
+    derivatives: Dict[str, str] = {}
\ No newline at end of file
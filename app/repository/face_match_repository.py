@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from app.core.database import database
+from app.model.face_match_model import FaceMatch
+from app.repository.base_repository import BaseRepository
+from app.schema.photo_schema import FindMeRequest
+
+
+class FaceMatchRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(database.get_collection("face_matches"))
+        self.collection.create_index([("user_id", ASCENDING), ("photo_id", ASCENDING)], unique=True)
+        self.collection.create_index([("user_id", ASCENDING), ("status", ASCENDING), ("distance", ASCENDING)])
+        self.collection.create_index("photo_id")
+        self.collection.create_index("face_id")
+
+    def save(self, match: FaceMatch):
+        # One match per user and photo, a closer face replaces the stored one
+        data = match.dict(by_alias=True)
+        data.pop("_id")
+        data["updated_at"] = datetime.utcnow()
+        query = {"user_id": match.user_id, "photo_id": match.photo_id}
+        result = self.collection.update_one({**query, "distance": {"$gt": match.distance}}, {"$set": data})
+        if result.matched_count:
+            return result
+        try:
+            return self.collection.update_one(query, {"$setOnInsert": match.dict(by_alias=True)}, upsert=True)
+        except DuplicateKeyError:
+            # Another worker inserted the same pair first, retry against its distance
+            return self.collection.update_one({**query, "distance": {"$gt": match.distance}}, {"$set": data})
+
+    def delete_by_photo(self, photo_id: ObjectId):
+        return self.collection.delete_many({"photo_id": photo_id})
+
+    def delete_by_face(self, face_id: ObjectId):
+        return self.collection.delete_many({"face_id": face_id})
+
+    def set_status(self, photo_id: ObjectId, status: str):
+        return self.collection.update_many({"photo_id": ObjectId(photo_id)}, {"$set": {"status": status, "updated_at": datetime.utcnow()}})
+
+    def find_photo_ids_without_status(self):
+        return self.collection.distinct("photo_id", {"status": {"$exists": False}})
+
+    def count_by_user(self, user_id: ObjectId):
+        return self.collection.count_documents({"user_id": user_id}, limit=1)
+
+    def list(self, request: FindMeRequest):
+        page = request.page if request.page else 1
+        size = request.size if request.size else 10
+        skip = (page - 1) * size
+
+        # Only the requested page is joined with its photos, the total is counted on the index
+        query = {"user_id": ObjectId(request.user_id), "status": "available"}
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"distance": 1}},
+            {"$skip": skip},
+            {"$limit": size},
+            {"$lookup": {
+                "from": "photos",
+                "let": {"photo_id": "$photo_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$photo_id"]}}},
+                    {"$project": {"detections.embeddings": 0}}
+                ],
+                "as": "photo"
+            }},
+            {"$unwind": "$photo"},
+        ]
+        matches = list(self.collection.aggregate(pipeline))
+        total = self.collection.count_documents(query)
+        return matches, total
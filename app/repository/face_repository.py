@@ -33,4 +33,17 @@ class FaceRepository(BaseRepository):
         return faces, total
 
     def find_by_user_id(self, user_id: ObjectId):
-        return self.collection.find_one({"user_id": user_id})
\ No newline at end of file
+        return self.collection.find_one({"user_id": user_id})
+
+    def find_by_faiss_ids(self, faiss_ids: list):
+        return list(self.collection.find({"detections.faiss_id": {"$in": faiss_ids}}, {"user_id": 1, "detections.faiss_id": 1}))
+
+    def find_unindexed(self, user_id: ObjectId = None):
+        # Faces registered before face matching have no faiss id yet
+        query = {"detections": {"$elemMatch": {"faiss_id": None}}}
+        if user_id:
+            query.update({"user_id": user_id})
+        return list(self.collection.find(query))
+
+    def set_faiss_ids(self, id: ObjectId, faiss_ids: list):
+        return self.collection.update_one({"_id": id}, {"$set": {f"detections.{i}.faiss_id": int(faiss_id) for i, faiss_id in enumerate(faiss_ids)}})
\ No newline at end of file
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from bson import Binary
+
+from app.core.database import database
+from app.repository.base_repository import BaseRepository
+
+
+class InferenceRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(database.get_collection("inference_cache"))
+
+    def find_by_hash(self, digest: str, version: str):
+        return self.collection.find_one({"_id": digest, "version": version})
+
+    def save(self, digest: str, version: str, boxes: list, embeddings: bytes):
+        return self.collection.update_one(
+            {"_id": digest},
+            {"$set": {"version": version, "boxes": boxes, "embeddings": Binary(embeddings), "updated_at": datetime.utcnow()},
+             "$setOnInsert": {"created_at": datetime.utcnow()}},
+            upsert=True
+        )
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app.core.database import database
+from app.model.job_model import IngestStatus
+from app.repository.base_repository import BaseRepository
+
+
+class JobRepository(BaseRepository):
+    def __init__(self):
+        super().__init__(database.get_collection("photo_jobs"))
+
+    def update_status(self, id: ObjectId, status: IngestStatus, photo_id: ObjectId = None, error: str = None):
+        update = {"status": status, "updated_at": datetime.utcnow()}
+        if photo_id:
+            update.update({"photo_id": photo_id})
+        if error:
+            update.update({"error": error})
+        return self.collection.update_one({"_id": id}, {"$set": update})
+
+    def find_by_user(self, id: ObjectId, user_id: ObjectId):
+        return self.collection.find_one({"_id": id, "user_id": user_id})
@@ -97,33 +97,23 @@ class PhotoRepository(BaseRepository):
     def find_by_sold(self, id: ObjectId):
         return self.collection.find_one({"_id": id, "status": "available"})
 
-    def find_by_faiss_id(self, faiss_id: int):
-        pipeline = [
-            {"$match": {"detections.faiss_id": faiss_id}},
-            {
-                "$project": {
-                    "detections": {
-                        "$filter": {
-                            "input": "$detections",
-                            "as": "detection",
-                            "cond": {"$eq": ["$$detection.faiss_id", faiss_id]}
-                        }
-                    },
-                    "base_price": 1,
-                    "buyer_id": 1,
-                    "created_at": 1,
-                    "deleted_at": 1,
-                    "description": 1,
-                    "name": 1,
-                    "sell_price": 1,
-                    "status": 1,
-                    "type": 1,
-                    "updated_at": 1,
-                    "url": 1,
-                    "user_id": 1
-                }
-            },
-            {"$unset": "detections.embeddings"},
-            {"$limit": 1}
-        ]
-        return list(self.collection.aggregate(pipeline))
\ No newline at end of file
+    def find_by_ids(self, ids: list, exclude: list = None, include: list = None):
+        if include:
+            projection = {field: 1 for field in include}
+        elif exclude:
+            projection = {field: 0 for field in exclude}
+        else:
+            projection = None
+        return list(self.collection.find({"_id": {"$in": ids}}, projection))
+
+    def find_by_faiss_ids(self, faiss_ids: list):
+        return list(self.collection.find({"detections.faiss_id": {"$in": faiss_ids}}, {"detections.embeddings": 0}))
+
+    def find_faiss_detections(self):
+        return self.collection.find({"type": "sell", "detections.faiss_id": {"$exists": True}}, {"detections.faiss_id": 1})
+
+    def find_without_derivatives(self):
+        return self.collection.find({"$or": [{"derivatives": {"$exists": False}}, {"derivatives": {}}]}, {"url": 1})
+
+    def set_derivatives(self, id: ObjectId, derivatives: dict):
+        return self.collection.update_one({"_id": id}, {"$set": {"derivatives": derivatives}})
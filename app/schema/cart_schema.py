@@ -22,6 +22,8 @@ class ListCartResponse(BaseModel):
     seller_id: str = Field(ObjectId, alias="seller_id")
     photo_id: str = Field(ObjectId, alias="photo_id")
     url: str
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
     name_photo: str
     name_seller: str
     price: float
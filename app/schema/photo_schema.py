@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict
 from decimal import Decimal
 
 from bson import ObjectId
@@ -13,6 +13,8 @@ class SellPhotoResponse(BaseModel):
     id: str = Field(ObjectId, alias="_id")
     name: str
     url: str
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
     base_price: float
     sell_price: float
     description: str
@@ -42,6 +44,8 @@ class PostPhotoResponse(BaseModel):
     id: str = Field(ObjectId, alias="_id")
     name: str
     url: str
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
     description: str
     type: str
     likes: int = 0
@@ -83,6 +87,8 @@ class PhotoHistoryResponse(BaseModel):
     id: str = Field(ObjectId, alias="_id")
     name: str
     url: str
+    thumbnail_url: Optional[str] = None
+    medium_url: Optional[str] = None
     price: float
 
     class Config:
@@ -99,6 +105,7 @@ class AddSellPhotoRequest(BaseModel):
     file: Optional[UploadFile]
     user_id: Optional[str] = None
     detections: Optional[Detections] = None
+    derivatives: Dict[str, str] = {}
 
     @classmethod
     def as_form(
@@ -120,6 +127,7 @@ class AddPostPhotoRequest(BaseModel):
     description: str
     user_id: Optional[str]
     file: Optional[UploadFile]
+    derivatives: Dict[str, str] = {}
 
     @classmethod
     def as_form(
@@ -171,4 +179,30 @@ class LikePhotoPostRequest(BaseModel):
 class CollectionPhotoRequest(BaseModel):
     buyer_id: Optional[str] = Field(None, description="Buyer ID")
     page: int = 1
-    size: int = 10
\ No newline at end of file
+    size: int = 10
+
+class FindMeRequest(BaseModel):
+    user_id: Optional[str] = Field(None, description="User ID")
+    page: int = 1
+    size: int = 10
+
+class IngestJobResponse(BaseModel):
+    id: str = Field(ObjectId, alias="_id")
+    user_id: str
+    url: str
+    status: str
+    photo_id: Optional[str] = None
+    error: Optional[str] = None
+    queue_depth: int = 0
+    queue_size: int = 0
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+class GetIngestJobRequest(BaseModel):
+    id: str
+    user_id: str
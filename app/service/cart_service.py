@@ -1,10 +1,8 @@
 from typing import Tuple, List
-from urllib.parse import urlparse
 
 from bson import ObjectId
 from fastapi import HTTPException
-from app.core.config import config
-from app.core.s3_client import s3_client
+from app.core.derivatives import presign_photos
 from app.model.cart_model import Cart
 from app.repository.cart_repository import CartRepository
 from app.repository.photo_repository import PhotoRepository
@@ -158,13 +156,16 @@ class CartService:
             carts, total = self.cart_repository.list(request)
             logger.info(f"List cart: {carts}")
             photos = []
-            for cart in carts:
-                photo = self.photo_repository.find_by_id(cart, exclude=["detections"])
+            items = [self.photo_repository.find_by_id(cart, exclude=["detections"]) for cart in carts]
+            presign_photos(items)
+            for photo in items:
                 seller = self.user_repository.find_by_id(photo["user_id"], include=["username", "_id"])
                 data = {
                     "photo_id": str(photo["_id"]),
                     "seller_id": str(seller["_id"]),
-                    "url": s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/")),
+                    "url": photo["url"],
+                    "thumbnail_url": photo["thumbnail_url"],
+                    "medium_url": photo["medium_url"],
                     "name_photo": photo["name"],
                     "name_seller": seller["username"],
                     "price": photo["sell_price"],
@@ -0,0 +1,73 @@
+import hashlib
+import os
+from typing import List, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.core.config import config
+from app.core.facenet import EMBEDDING_DIM
+from app.core.inference import inference_executor
+from app.core.logger import logger
+from app.core.lru_cache import LRUCache
+from app.model.face_model import encode_embeddings, decode_embeddings
+from app.repository.inference_repository import InferenceRepository
+
+# Shared by every service instance in this process
+inference_cache = LRUCache(config.inference_cache_size)
+
+
+class InferenceService:
+    def __init__(self):
+        self.inference_repository = InferenceRepository()
+        # Results from another model or detection size are not reused
+        model = config.onnx_model if config.embedding_backend == "onnx" else config.pre_trained_model
+        self.version = f"{os.path.basename(model)}:{config.detection_max_edge}"
+
+    def ensure_enabled(self):
+        if not inference_executor.enabled:
+            raise HTTPException(status_code=503, detail="Face inference is not available on this worker")
+
+    def find_cached(self, digest: str):
+        result = inference_cache.get(digest)
+        if result is not None:
+            return result
+        try:
+            document = self.inference_repository.find_by_hash(digest, self.version)
+        except Exception as e:
+            logger.warning(f"Inference cache lookup failed: {e}")
+            return None
+        if document is None:
+            return None
+        boxes = [tuple(box) for box in document["boxes"]]
+        # No-face results are cached too, a 0-row array cannot be reshaped with -1
+        embeddings = decode_embeddings(document["embeddings"]).reshape(len(boxes), EMBEDDING_DIM)
+        result = (boxes, embeddings)
+        inference_cache.set(digest, result)
+        return result
+
+    def detect_and_embed(self, data: bytes) -> Tuple[List[tuple], np.ndarray]:
+        # Re-uploads of the same file skip detection and embedding entirely
+        digest = hashlib.sha256(data).hexdigest()
+        result = self.find_cached(digest)
+        if result is not None:
+            logger.info(f"Inference cache hit for {digest}")
+            return result
+
+        self.ensure_enabled()
+        boxes, embeddings = inference_executor.detect_and_embed(data)
+        boxes = [tuple(int(value) for value in box) for box in boxes]
+        result = (boxes, embeddings)
+        inference_cache.set(digest, result)
+        try:
+            self.inference_repository.save(digest, self.version, [list(box) for box in boxes], encode_embeddings(embeddings))
+        except Exception as e:
+            logger.warning(f"Inference cache store failed: {e}")
+        return result
+
+    def detect(self, data: bytes) -> List[tuple]:
+        result = inference_cache.get(hashlib.sha256(data).hexdigest())
+        if result is not None:
+            return result[0]
+        self.ensure_enabled()
+        return inference_executor.detect(data)
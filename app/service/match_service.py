@@ -0,0 +1,135 @@
+from typing import List, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from app.core.config import config
+from app.core.face_table import face_table
+from app.core.faiss_vector import get_faiss_vector
+from app.core.logger import logger
+from app.model.face_match_model import FaceMatch
+from app.model.face_model import Detections, decode_embeddings
+from app.repository.face_match_repository import FaceMatchRepository
+from app.repository.face_repository import FaceRepository
+from app.repository.photo_repository import PhotoRepository
+from app.schema.photo_schema import FindMeRequest
+
+
+class MatchService:
+    def __init__(self):
+        self.face_match_repository = FaceMatchRepository()
+        self.face_repository = FaceRepository()
+        self.photo_repository = PhotoRepository()
+
+    # The indexes are opened on first use, api-only workers and routes without matching never load them
+    @property
+    def photo_vector(self):
+        return get_faiss_vector()
+
+    @property
+    def face_vector(self):
+        return get_faiss_vector(config.face_index_file)
+
+    def resolve_faiss_ids(self, faiss_ids) -> List[Tuple[int, dict]]:
+        faiss_ids = [int(faiss_id) for faiss_id in faiss_ids]
+        face_table.ensure_loaded(self.photo_repository.find_faiss_detections)
+        photo_ids = {}
+        for faiss_id in faiss_ids:
+            entry = face_table.get(faiss_id)
+            if entry:
+                photo_ids[faiss_id] = entry["photo_id"]
+
+        photos = {}
+        if photo_ids:
+            for photo in self.photo_repository.find_by_ids(list(set(photo_ids.values())), exclude=["detections.embeddings"]):
+                photos[photo["_id"]] = photo
+
+        # Faces indexed by another worker are not in this worker's table yet
+        missing = [faiss_id for faiss_id in faiss_ids if photo_ids.get(faiss_id) not in photos]
+        if missing:
+            for photo in self.photo_repository.find_by_faiss_ids(missing):
+                photos[photo["_id"]] = photo
+                detection_ids = [detection.get("faiss_id") for detection in photo["detections"]]
+                face_table.set_photo(photo["_id"], detection_ids)
+                for faiss_id in detection_ids:
+                    photo_ids[faiss_id] = photo["_id"]
+
+        return [(faiss_id, photos[photo_ids[faiss_id]]) for faiss_id in faiss_ids if photo_ids.get(faiss_id) in photos]
+
+    def closest(self, faiss_vector, embeddings) -> List[dict]:
+        # Every neighbour inside the threshold for each embedding, keyed by faiss id.
+        # All embeddings of a photo or face share a single range search.
+        results = faiss_vector.range_search_batch(np.stack(embeddings), threshold=config.face_match_threshold)
+        return [{int(faiss_id): float(distance) for distance, faiss_id in zip(distances, indices)} for distances, indices in results]
+
+    def index_face(self, embeddings) -> List[int]:
+        return [int(faiss_id) for faiss_id in self.face_vector.add(embeddings)]
+
+    def match_photo(self, photo_id: ObjectId, detections: List[Detections], status: str) -> int:
+        # New sell photo faces are searched against the registered user faces
+        detections = [detection for detection in detections if detection.faiss_id is not None]
+        if not detections:
+            return 0
+        best = {}
+        embeddings = [decode_embeddings(detection.embeddings) for detection in detections]
+        for detection, hits in zip(detections, self.closest(self.face_vector, embeddings)):
+            for face_faiss_id, distance in hits.items():
+                if distance < best.get(face_faiss_id, (np.inf, None))[0]:
+                    best[face_faiss_id] = (distance, detection.faiss_id)
+        if not best:
+            return 0
+
+        matches = {}
+        for face in self.face_repository.find_by_faiss_ids(list(best)):
+            for detection in face["detections"]:
+                hit = best.get(detection.get("faiss_id"))
+                if hit is None:
+                    continue
+                distance, faiss_id = hit
+                current = matches.get(face["user_id"])
+                if current is None or distance < current.distance:
+                    matches[face["user_id"]] = FaceMatch(user_id=face["user_id"], face_id=face["_id"], photo_id=photo_id, faiss_id=faiss_id, distance=distance, status=status)
+        for match in matches.values():
+            self.face_match_repository.save(match)
+        logger.info(f"Matched photo {photo_id} to {len(matches)} users")
+        return len(matches)
+
+    def match_face(self, face_id: ObjectId, user_id: ObjectId, embeddings) -> int:
+        # A newly registered face is searched once against every sell photo face
+        hits = {}
+        for face_hits in self.closest(self.photo_vector, list(embeddings)):
+            for faiss_id, distance in face_hits.items():
+                if distance < hits.get(faiss_id, np.inf):
+                    hits[faiss_id] = distance
+        if not hits:
+            return 0
+        matches = {}
+        for faiss_id, photo in self.resolve_faiss_ids(hits):
+            if photo["type"] != "sell":
+                continue
+            distance = hits[faiss_id]
+            if distance < matches.get(photo["_id"], (np.inf,))[0]:
+                matches[photo["_id"]] = (distance, faiss_id, photo["status"])
+        for photo_id, (distance, faiss_id, status) in matches.items():
+            self.face_match_repository.save(FaceMatch(user_id=user_id, face_id=face_id, photo_id=photo_id, faiss_id=faiss_id, distance=distance, status=status))
+        logger.info(f"Matched face {face_id} to {len(matches)} photos")
+        return len(matches)
+
+    def register_face(self, face: dict) -> int:
+        # Adds a stored face to the user face index and computes its matches
+        embeddings = np.stack([decode_embeddings(detection["embeddings"]) for detection in face["detections"]])
+        faiss_ids = self.index_face(embeddings)
+        self.face_repository.set_faiss_ids(face["_id"], faiss_ids)
+        return self.match_face(face["_id"], face["user_id"], embeddings)
+
+    def ensure_indexed(self, user_id: ObjectId = None) -> int:
+        faces = self.face_repository.find_unindexed(user_id)
+        for face in faces:
+            self.register_face(face)
+        return len(faces)
+
+    def list(self, request: FindMeRequest):
+        return self.face_match_repository.list(request)
+
+    def delete_photo(self, photo_id: ObjectId):
+        return self.face_match_repository.delete_by_photo(photo_id)
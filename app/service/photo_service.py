@@ -1,6 +1,6 @@
+import queue
 from io import BytesIO
-from typing import Tuple, List
-from urllib.parse import urlparse
+from typing import BinaryIO, Dict, Tuple, List, Union
 from uuid import uuid4
 
 from PIL import Image
@@ -8,30 +8,44 @@ from bson import ObjectId
 from fastapi import UploadFile, HTTPException
 from fastapi.responses import StreamingResponse
 from app.repository.user_repository import UserRepository
-from app.core.detector import face_detector
-from app.core.facenet import facenet_model
-from app.core.faiss_vector import FaissVector
+from app.service.inference_service import InferenceService
+from app.service.match_service import MatchService
+from app.core.face_table import face_table
+from app.core.faiss_vector import get_faiss_vector
+from app.core.ingest_queue import ingest_queue
 from app.core.logger import logger
 import numpy as np
 from app.core.config import config
-from app.core.s3_client import s3_client
-from app.core.utils import create_watermark
+from app.core.derivatives import derivative_uploads, presign_photos
+from app.core.storage import storage
+from app.core.utils import watermark_engine
+from app.model.face_model import encode_embeddings
+from app.model.job_model import IngestJob, IngestStatus
 from app.model.photo_model import SellPhoto, PostPhoto
 from app.repository.face_repository import FaceRepository
+from app.repository.job_repository import JobRepository
 from app.repository.photo_repository import PhotoRepository
 from app.schema.photo_schema import AddSellPhotoRequest, SellPhotoResponse, AddPostPhotoRequest, PostPhotoResponse, \
     GetPhotoRequest, DeletePhotoRequest, UpdatePostPhotoRequest, UpdateSellPhotoRequest, LikePhotoPostRequest, \
-    ListPhotoRequest, CollectionPhotoRequest, SamplePhotoResponse, SamplePhotoRequest
+    ListPhotoRequest, CollectionPhotoRequest, SamplePhotoResponse, SamplePhotoRequest, IngestJobResponse, \
+    GetIngestJobRequest, FindMeRequest
 
 
 class PhotoService:
     def __init__(self):
         self.photo_repository = PhotoRepository()
-        self.faiss_vector = FaissVector()
         self.face_repository = FaceRepository()
         self.user_repository = UserRepository()
+        self.job_repository = JobRepository()
+        self.inference_service = InferenceService()
+        self.match_service = MatchService()
 
-    def add_sell_photo(self, request: AddSellPhotoRequest, file: UploadFile) -> SellPhotoResponse:
+    @property
+    def faiss_vector(self):
+        # Opened on the first indexed or deleted photo, not when the router is imported
+        return get_faiss_vector()
+
+    def validate_sell_photo(self, request: AddSellPhotoRequest):
         errors = {}
 
         required_fields = {
@@ -50,42 +64,161 @@ class PhotoService:
             logger.warning(f"Validation errors: {errors}")
             raise HTTPException(status_code=400, detail=errors)
 
+    def index_faces(self, data: bytes) -> Tuple[List[dict], List[Tuple[BytesIO, str]]]:
+        # Detection and embedding run in the inference pool, the previews are rendered
+        # from a single decode of the upload in this process. The previews are returned
+        # as (file, key) pairs so the caller uploads them in one batch with the original.
+        boxes, embeddings = self.inference_service.detect_and_embed(data)
+        if not boxes:
+            raise HTTPException(status_code=400, detail="No face detected")
+        faces = []
+        uploads = []
+        faiss_ids = [int(faiss_id) for faiss_id in self.faiss_vector.add(embeddings)]
         try:
-            detected_faces = face_detector.detect_faces(file)
-            if not detected_faces:
-                raise HTTPException(status_code=400, detail="No face detected")
-            faces = []
-            for face, (x, y, width, height) in detected_faces:
-                face_embedding = facenet_model.get_embeddings(face)
-                logger.info(f"Length of face embedding: {len(face_embedding)}")
-                self.faiss_vector.add(face_embedding)
-                faiss_id = self.faiss_vector.index.ntotal - 1
-                file.file.seek(0)
-                watermark = create_watermark(file, [(x, y, width, height)])
-                watermarked_image = Image.fromarray(watermark)
+            image = Image.open(BytesIO(data))
+            for i, ((x, y, width, height), watermarked_image) in enumerate(zip(boxes, watermark_engine.previews(image, boxes))):
+                face_embedding = embeddings[i:i + 1]
+                faiss_id = faiss_ids[i]
                 watermarked_image_io = BytesIO()
                 watermarked_image.save(watermarked_image_io, format='JPEG')
                 watermarked_image_io.seek(0)
-                file_path = f"watermark/{faiss_id}.jpg"
-                s3_client.upload_file(watermarked_image_io, config.aws_bucket, file_path)
+                file_path = face_table.preview_key(faiss_id)
+                uploads.append((watermarked_image_io, file_path))
                 faces.append(
-                    {"embeddings": face_embedding.tolist(), "box": {"x": x, "y": y, "width": width, "height": height}, "faiss_id": faiss_id, "url": f"{config.aws_url}{file_path}"})
-            request.detections = faces
+                    {"embeddings": encode_embeddings(face_embedding), "box": {"x": x, "y": y, "width": width, "height": height}, "faiss_id": faiss_id, "url": storage.url(file_path)})
+        except Exception:
+            self.remove_faces(faiss_ids)
+            raise
+        return faces, uploads
 
-            request.user_id = ObjectId(request.user_id)
-            file_path = f"photos/sell/{uuid4()}_{file.filename}"
-            file.file.seek(0)
-            s3_client.upload_file(file.file, config.aws_bucket, file_path)
-            request.url = f"{config.aws_url}{file_path}"
-            photo = SellPhoto(**request.dict())
-            result = self.photo_repository.create(photo)
+    def remove_faces(self, faiss_ids: List[int]):
+        # Faces of a photo that was never stored are dropped from the index again
+        try:
+            self.faiss_vector.remove(faiss_ids)
+        except Exception as e:
+            logger.warning(f"Error during remove faces {faiss_ids}: {str(e)}")
+
+    def match_photo(self, photo_id: ObjectId, photo: SellPhoto):
+        # The photo is already stored, a failed match must not fail the upload or invite a retry
+        face_table.set_photo(photo_id, [detection.faiss_id for detection in photo.detections])
+        try:
+            self.match_service.match_photo(photo_id, photo.detections, photo.status)
+        except Exception as e:
+            logger.warning(f"Error during match photo {photo_id}: {str(e)}")
+
+    def create_derivatives(self, data: Union[bytes, BinaryIO], file_path: str) -> Tuple[Dict[str, str], List[Tuple[BytesIO, str]]]:
+        # A photo without renditions is still listed through its original URL
+        try:
+            return derivative_uploads(data, file_path)
+        except Exception as e:
+            logger.warning(f"Error during create derivatives of {file_path}: {str(e)}")
+            return {}, []
+
+    def add_sell_photo(self, request: AddSellPhotoRequest, file: UploadFile) -> SellPhotoResponse:
+        self.validate_sell_photo(request)
+
+        try:
+            data = file.file.read()
+            request.detections, uploads = self.index_faces(data)
+            try:
+                request.user_id = ObjectId(request.user_id)
+                file_path = f"photos/sell/{uuid4()}_{file.filename}"
+                file.file.seek(0)
+                request.url = storage.url(file_path)
+                request.derivatives, rendition_uploads = self.create_derivatives(data, file_path)
+                # Previews, renditions and the original go up concurrently, the request waits once
+                storage.upload_many([(file.file, file_path)] + uploads + rendition_uploads)
+                photo = SellPhoto(**request.dict())
+                result = self.photo_repository.create(photo)
+            except Exception:
+                self.remove_faces([face["faiss_id"] for face in request.detections])
+                raise
+            self.match_photo(result.inserted_id, photo)
             photo.id = str(result.inserted_id)
             photo.user_id = str(photo.user_id)
             return SellPhotoResponse(**photo.dict(by_alias=True))
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error during add sell photo: {str(e)}")
             raise HTTPException(status_code=400, detail=str(e))
 
+    def ingest_sell_photo(self, request: AddSellPhotoRequest, file: UploadFile) -> IngestJobResponse:
+        self.validate_sell_photo(request)
+        self.inference_service.ensure_enabled()
+
+        if ingest_queue.full():
+            logger.warning(f"Ingest queue is full: {ingest_queue.depth}/{ingest_queue.capacity}")
+            raise HTTPException(status_code=503, detail="Ingest queue is full, try again later")
+
+        try:
+            file_path = f"photos/sell/{uuid4()}_{file.filename}"
+            file.file.seek(0)
+            storage.upload_file(file.file, config.aws_bucket, file_path)
+            request.url = storage.url(file_path)
+            request.file = None
+
+            job = IngestJob(user_id=ObjectId(request.user_id), url=request.url)
+            self.job_repository.create(job)
+            try:
+                # Queued jobs only hold the storage key, the worker reads the original back
+                ingest_queue.submit(self.process_sell_photo, job.id, request)
+            except queue.Full:
+                self.job_repository.update_status(job.id, IngestStatus.FAILED, error="Ingest queue is full")
+                raise HTTPException(status_code=503, detail="Ingest queue is full, try again later")
+            return self.job_response(job.dict(by_alias=True))
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error during ingest sell photo: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
+
+    def process_sell_photo(self, job_id: ObjectId, request: AddSellPhotoRequest):
+        self.job_repository.update_status(job_id, IngestStatus.PROCESSING)
+        try:
+            file_path = storage.object_key(request.url)
+            original = BytesIO()
+            storage.download_file(config.aws_bucket, file_path, original)
+            data = original.getvalue()
+            original.close()
+            request.detections, uploads = self.index_faces(data)
+            try:
+                request.derivatives, rendition_uploads = self.create_derivatives(data, file_path)
+                storage.upload_many(uploads + rendition_uploads)
+                request.user_id = ObjectId(request.user_id)
+                photo = SellPhoto(**request.dict())
+                result = self.photo_repository.create(photo)
+            except Exception:
+                self.remove_faces([face["faiss_id"] for face in request.detections])
+                raise
+            self.match_photo(result.inserted_id, photo)
+            self.job_repository.update_status(job_id, IngestStatus.DONE, photo_id=result.inserted_id)
+            logger.info(f"Ingest job {job_id} done: {result.inserted_id}")
+        except HTTPException as e:
+            logger.error(f"Ingest job {job_id} failed: {e.detail}")
+            self.job_repository.update_status(job_id, IngestStatus.FAILED, error=str(e.detail))
+        except Exception as e:
+            logger.error(f"Ingest job {job_id} failed: {str(e)}")
+            self.job_repository.update_status(job_id, IngestStatus.FAILED, error=str(e))
+
+    def get_job(self, request: GetIngestJobRequest) -> IngestJobResponse:
+        try:
+            job = self.job_repository.find_by_user(ObjectId(request.id), ObjectId(request.user_id))
+        except Exception as e:
+            logger.error(f"Error during get ingest job: {str(e)}")
+            raise HTTPException(status_code=400, detail="Error during get ingest job")
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return self.job_response(job)
+
+    def job_response(self, job: dict) -> IngestJobResponse:
+        job["_id"] = str(job["_id"])
+        job["user_id"] = str(job["user_id"])
+        job["photo_id"] = str(job["photo_id"]) if job.get("photo_id") else None
+        job["queue_depth"] = ingest_queue.depth
+        job["queue_size"] = ingest_queue.capacity
+        return IngestJobResponse(**job)
+
     def add_post_photo(self, request: AddPostPhotoRequest, file: UploadFile) -> PostPhotoResponse:
         errors = {}
         required_fields = {
@@ -105,8 +238,10 @@ class PhotoService:
         try:
             file_path = f"photos/post/{uuid4()}_{file.filename}"
             file.file.seek(0)
-            s3_client.upload_file(file.file, config.aws_bucket, file_path)
-            request.url = f"{config.aws_url}{file_path}"
+            request.derivatives, uploads = self.create_derivatives(file.file, file_path)
+            file.file.seek(0)
+            storage.upload_many([(file.file, file_path)] + uploads)
+            request.url = storage.url(file_path)
             request.user_id = ObjectId(request.user_id)
             photo = PostPhoto(**request.dict())
             result = self.photo_repository.create(photo)
@@ -124,7 +259,7 @@ class PhotoService:
             if not photo:
                 raise HTTPException(status_code=404, detail="Photo not found")
             if isinstance(photo, dict):
-                photo["url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/"))
+                photo["url"] = storage.get_object(config.aws_bucket, storage.object_key(photo["url"]))
                 if photo["type"] == "sell":
                     photo = SellPhoto(**photo)
                     photo.id = str(photo.id)
@@ -148,16 +283,15 @@ class PhotoService:
     def list(self, request: ListPhotoRequest) -> Tuple[List[dict], int]:
         try:
             photos, total = self.photo_repository.list(request)
+            presign_photos(photos)
             if request.type == "sell":
                 for photo in photos:
-                    photo["url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/"))
                     photo["_id"] = str(photo["_id"])
                     photo["user_id"] = str(photo["user_id"])
                     photo["buyer_id"] = str(photo["buyer_id"]) if photo["buyer_id"] else None
                 return [SellPhotoResponse(**photo).dict(by_alias=True) for photo in photos], total
             else:
                 for photo in photos:
-                    photo["url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/"))
                     photo["_id"] = str(photo["_id"])
                     photo["user_id"] = str(photo["user_id"])
                     photo["liked"] = True if ObjectId(request.user_id) in photo["likes"] else False
@@ -263,6 +397,11 @@ class PhotoService:
             logger.info(f"Delete photo response: {result}")
             if result.deleted_count == 0:
                 raise HTTPException(status_code=400, detail="Error during delete photo")
+            if photo.type == "sell":
+                faiss_ids = [detection.faiss_id for detection in photo.detections if detection.faiss_id is not None]
+                self.faiss_vector.remove(faiss_ids)
+                face_table.remove(faiss_ids)
+                self.match_service.delete_photo(photo.id)
             return True
         except Exception as e:
             logger.error(f"Error during delete photo: {str(e)}")
@@ -300,14 +439,14 @@ class PhotoService:
             photos = self.photo_repository.sample_photos()
             for photo in photos:
                 user = self.user_repository.find_by_id(photo["user_id"], include=["username", "photo", "following"])
-                photo["url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/"))
+                photo["url"] = storage.get_object(config.aws_bucket, storage.object_key(photo["url"]))
                 photo["_id"] = str(photo["_id"])
                 photo["user_id"] = str(photo["user_id"])
                 photo["liked"] = True if ObjectId(request.user_id) in photo["likes"] else False
                 photo["likes"] = len(photo["likes"])
                 photo["user_following"] = ObjectId(photo["user_id"]) in user["following"] if user["following"] else False
                 photo["user_name"] = user["username"]
-                photo["user_photo"] = s3_client.get_object(config.aws_bucket, urlparse(user["photo"]).path.lstrip("/")) if user["photo"] else None
+                photo["user_photo"] = storage.get_object(config.aws_bucket, storage.object_key(user["photo"])) if user["photo"] else None
             return [SamplePhotoResponse(**photo).dict(by_alias=True) for photo in photos]
         except Exception as e:
             logger.error(f"Error during sample photos: {str(e)}")
@@ -316,8 +455,8 @@ class PhotoService:
     def collection_photos(self, request: CollectionPhotoRequest) -> Tuple[List[dict], int]:
         try:
             photos, total = self.photo_repository.collection_photos(request)
+            presign_photos(photos)
             for photo in photos:
-                photo["url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/"))
                 photo["_id"] = str(photo["_id"])
                 photo["user_id"] = str(photo["user_id"])
                 photo["buyer_id"] = str(photo["buyer_id"]) if photo["buyer_id"] else None
@@ -326,27 +465,27 @@ class PhotoService:
             logger.error(f"Error during collection photos: {str(e)}")
             raise HTTPException(status_code=400, detail="Error during collection photos")
 
-    def findme(self, user_id: str) -> List[SellPhotoResponse]:
+    def findme(self, request: FindMeRequest) -> Tuple[List[dict], int]:
         try:
-            face = self.face_repository.find_by_user_id(ObjectId(user_id))
-            if not face:
-                raise HTTPException(status_code=404, detail="Face not found")
-            face_embedding = face["detections"][0]["embeddings"]
-            distances, indices = self.faiss_vector.search(face_embedding, threshold=0.8)
+            # Matches are computed when photos and faces are added, faces registered
+            # before that are matched on their first findme
+            self.match_service.ensure_indexed(ObjectId(request.user_id))
+            matches, total = self.match_service.list(request)
 
-            logger.info(f"Findme: {distances}, {indices}")
             matched_photos = []
-            for distance, index in zip(distances, indices):
-                data = self.photo_repository.find_by_faiss_id(int(index))
-                photo = data[0] if data else None
-                logger.info(f"Findme photo: {photo}")
-                if photo and photo["status"] == "available":
-                    photo["url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["detections"][0]["url"]).path.lstrip("/"))
-                    photo["_id"] = str(photo["_id"])
-                    photo["user_id"] = str(photo["user_id"])
-                    photo["buyer_id"] = str(photo["buyer_id"]) if photo["buyer_id"] else None
-                    matched_photos.append(SellPhotoResponse(**photo).dict(by_alias=True))
-            return matched_photos
+            preview_urls = []
+            for match in matches:
+                detection = next((detection for detection in match["photo"]["detections"] if detection.get("faiss_id") == match["faiss_id"]), None)
+                preview_urls.append(detection["url"] if detection else match["photo"]["url"])
+            for match, url in zip(matches, storage.presign_urls(preview_urls)):
+                photo = match["photo"]
+                data = dict(photo)
+                data["url"] = url
+                data["_id"] = str(photo["_id"])
+                data["user_id"] = str(photo["user_id"])
+                data["buyer_id"] = str(photo["buyer_id"]) if photo["buyer_id"] else None
+                matched_photos.append(SellPhotoResponse(**data).dict(by_alias=True))
+            return matched_photos, total
         except Exception as e:
             logger.error(f"Error during findme: {str(e)}")
-            raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+            raise HTTPException(status_code=400, detail=str(e))
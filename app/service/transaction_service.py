@@ -3,20 +3,21 @@ import hmac
 import math
 from datetime import datetime
 from typing import Tuple
-from urllib.parse import urlparse
 
 import requests
 from bson import ObjectId
 from fastapi import HTTPException
 from pymongo.results import UpdateResult
 
-from app.core.s3_client import s3_client
+from app.core.storage import storage
+from app.core.derivatives import presign_photos
 from app.model.photo_model import SellPhoto, StatusSellPhoto
 
 from app.core.config import config
 from app.core.security import get_encoded_server_key
 from app.model.transaction_model import Transaction, Payment
 from app.repository.cart_repository import CartRepository
+from app.repository.face_match_repository import FaceMatchRepository
 from app.repository.photo_repository import PhotoRepository
 from app.repository.transaction_repository import TransactionRepository
 from app.repository.user_repository import UserRepository
@@ -33,6 +34,7 @@ class TransactionService:
         self.photo_repository = PhotoRepository()
         self.user_repository = UserRepository()
         self.cart_repository = CartRepository()
+        self.face_match_repository = FaceMatchRepository()
         self.server_key = get_encoded_server_key()
         self.url = config.url_sandbox if config.app_env == "local" else config.url_production
 
@@ -83,6 +85,7 @@ class TransactionService:
             for photo in photo_update_results:
                 photo = SellPhoto(**photo)
                 update_photo = self.photo_repository.update(photo)
+                self.face_match_repository.set_status(photo.id, photo.status)
                 logger.info(f"Photo updated: {update_photo}")
 
             payment = self.qris_payment(transaction)
@@ -147,6 +150,11 @@ class TransactionService:
     def list_by_buyer(self, request: ListTransactionRequest) -> Tuple[List[dict], int]:
         try:
             transactions, total = self.transaction_repository.list_by_buyer(request)
+            # Photos of the whole page are loaded once and presigned in one pass
+            photo_ids = {ObjectId(photo_id) for transaction in transactions for detail in transaction["details"] for photo_id in detail["photo_id"]}
+            photos = self.photo_repository.find_by_ids(list(photo_ids), include=["_id", "name", "url", "derivatives", "sell_price"])
+            page_photos = {str(photo["_id"]): photo for photo in photos}
+            presign_photos(list(page_photos.values()))
             result = []
             for transaction in transactions:
                 transaction_data = {}
@@ -162,11 +170,13 @@ class TransactionService:
                     detail_data["total"] = detail["total"]
                     photos = []
                     for photo_id in detail["photo_id"]:
-                        photo = self.photo_repository.find_by_id(ObjectId(photo_id), include=["_id", "name", "url", "sell_price"])
+                        photo = page_photos[str(photo_id)]
                         photo_data = {}
                         photo_data["_id"] = str(photo["_id"])
                         photo_data["name"] = photo["name"]
-                        photo_data["url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/"))
+                        photo_data["url"] = photo["url"]
+                        photo_data["thumbnail_url"] = photo["thumbnail_url"]
+                        photo_data["medium_url"] = photo["medium_url"]
                         photo_data["price"] = photo["sell_price"]
                         photos.append(PhotoHistoryResponse(**photo_data).dict(by_alias=True))
                     detail_data["photos"] = photos
@@ -190,7 +200,7 @@ class TransactionService:
                     photo = self.photo_repository.find_by_id(ObjectId(photo_id), include=["_id", "name", "url", "sell_price"])
                     photo_data = {}
                     photo_data["photo_name"] = photo["name"]
-                    photo_data["photo_url"] = s3_client.get_object(config.aws_bucket, urlparse(photo["url"]).path.lstrip("/"))
+                    photo_data["photo_url"] = storage.get_object(config.aws_bucket, storage.object_key(photo["url"]))
                     photo_data["date"] = date
                     photo_data["username"] = buyer["username"]
                     photo_data["price"] = photo["sell_price"]
@@ -259,7 +269,9 @@ class TransactionService:
                     photo["status"] = StatusSellPhoto.SOLD
                     photo["updated_at"] = datetime.now()
                     total += photo["base_price"]
-                    self.photo_repository.update(SellPhoto(**photo))
+                    photo = SellPhoto(**photo)
+                    self.photo_repository.update(photo)
+                    self.face_match_repository.set_status(photo.id, photo.status)
                 balance = seller["balance"] + total
                 self.user_repository.update_balance(seller["_id"], balance)
 
@@ -284,7 +296,9 @@ class TransactionService:
                     photo = self.photo_repository.find_by_id(ObjectId(photo_id))
                     photo["status"] = StatusSellPhoto.AVAILABLE
                     photo["updated_at"] = datetime.now()
-                    self.photo_repository.update(SellPhoto(**photo))
+                    photo = SellPhoto(**photo)
+                    self.photo_repository.update(photo)
+                    self.face_match_repository.set_status(photo.id, photo.status)
 
             logger.info(f"Transaction update status: {transaction}")
         else:
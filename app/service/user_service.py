@@ -1,6 +1,5 @@
 from datetime import datetime
 from typing import List, Tuple
-from urllib.parse import urlparse
 from uuid import uuid4
 
 from bson import ObjectId
@@ -10,7 +9,7 @@ from starlette.responses import JSONResponse
 
 from app.core.config import config
 from app.core.logger import logger
-from app.core.s3_client import s3_client
+from app.core.storage import storage
 from app.http.middleware.auth import remove_expired_token
 
 from app.model.user_model import User
@@ -114,7 +113,7 @@ class UserService:
             user = self.user_repository.find_by_id(ObjectId(request.id), exclude=["password", "accounts"])
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
-            user["photo"] = s3_client.get_object(config.aws_bucket, urlparse(user["photo"]).path.lstrip("/")) if user.get("photo") else None
+            user["photo"] = storage.get_object(config.aws_bucket, storage.object_key(user["photo"])) if user.get("photo") else None
             user['_id'] = str(user["_id"])
             user["followers"] = len(user["followers"])
             user["following"] = len(user["following"])
@@ -247,16 +246,16 @@ class UserService:
 
             # Upload the file to S3
             file.file.seek(0)  # Ensure the file pointer is at the beginning
-            s3_client.upload_file(file.file, config.aws_bucket, path)
-            url = f"{config.aws_url}{path}"
+            storage.upload_file(file.file, config.aws_bucket, path)
+            url = storage.url(path)
             user["photo"] = url
             data = User(**user)
             update_result: UpdateResult = self.user_repository.update(data)
             if update_result.modified_count == 1 or update_result.upserted_id:
                 logger.info(f"Photo changed successfully: {url}")
                 updated_user = self.user_repository.find_by_id(ObjectId(request.id))
-                updated_user['photo'] = s3_client.get_object(config.aws_bucket,
-                                                             urlparse(updated_user["photo"]).path.lstrip("/"))
+                updated_user['photo'] = storage.get_object(config.aws_bucket,
+                                                             storage.object_key(updated_user["photo"]))
                 updated_user['_id'] = str(updated_user["_id"])
                 updated_user["followers"] = len(updated_user["followers"])
                 updated_user["following"] = len(updated_user["following"])
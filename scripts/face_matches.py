@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.model.face_model import decode_embeddings
+from app.service.match_service import MatchService
+
+
+def index(args):
+    match_service = MatchService()
+    print(f"Indexed {match_service.ensure_indexed()} registered faces")
+    match_service.face_vector.close()
+
+
+def rematch(args):
+    # Recomputes every user's matches, e.g. after the threshold changed
+    match_service = MatchService()
+    match_service.ensure_indexed()
+    faces = match_service.face_repository.collection.find({"detections.faiss_id": {"$ne": None}})
+    matched = 0
+    for face in faces:
+        if args.reset:
+            match_service.face_match_repository.delete_by_face(face["_id"])
+        embeddings = np.stack([decode_embeddings(detection["embeddings"]) for detection in face["detections"]])
+        matched += match_service.match_face(face["_id"], face["user_id"], embeddings)
+    print(f"Stored {matched} face matches")
+    match_service.face_vector.close()
+
+
+def sync_status(args):
+    # Copies the photo status onto matches stored before face_matches kept it
+    match_service = MatchService()
+    photo_ids = match_service.face_match_repository.find_photo_ids_without_status()
+    for photo in match_service.photo_repository.find_by_ids(photo_ids, exclude=["detections"]):
+        match_service.face_match_repository.set_status(photo["_id"], photo["status"])
+    print(f"Updated the status of matches on {len(photo_ids)} photos")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the precomputed findme matches")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = commands.add_parser("index", help="Add registered faces without a faiss id to the face index")
+    index_parser.set_defaults(func=index)
+
+    rematch_parser = commands.add_parser("rematch", help="Search every registered face against the photo index again")
+    rematch_parser.add_argument("--reset", action="store_true", help="Drop existing matches of each face first")
+    rematch_parser.set_defaults(func=rematch)
+
+    status_parser = commands.add_parser("sync-status", help="Copy the photo status onto matches stored without one")
+    status_parser.set_defaults(func=sync_status)
+
+    args = parser.parse_args()
+    args.func(args)
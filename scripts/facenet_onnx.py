@@ -0,0 +1,180 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from app.core.config import config
+
+
+def export(args):
+    import tensorflow as tf
+    import tf2onnx
+
+    graph_def = tf.compat.v1.GraphDef()
+    with tf.io.gfile.GFile(args.model or config.pre_trained_model, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+    tf2onnx.convert.from_graph_def(
+        graph_def,
+        input_names=["input:0", "phase_train:0"],
+        output_names=["embeddings:0"],
+        opset=args.opset,
+        output_path=args.output
+    )
+    print(f"Exported {args.model or config.pre_trained_model} to {args.output}")
+
+
+def quantize(args):
+    from onnxruntime.quantization import CalibrationDataReader, QuantType, quantize_dynamic, quantize_static
+    from app.core.facenet import OnnxFaceNetModel
+
+    if args.mode == "dynamic":
+        quantize_dynamic(args.onnx_model, args.output, weight_type=QuantType.QInt8)
+    else:
+        # Static quantization calibrates activation ranges on real faces
+        model = OnnxFaceNetModel(args.onnx_model)
+        faces = load_faces(args)
+
+        class FaceReader(CalibrationDataReader):
+            def __init__(self):
+                self.batches = iter(faces)
+
+            def get_next(self):
+                face = next(self.batches, None)
+                if face is None:
+                    return None
+                feed = {model.input_name: model.preprocess(face)[None].astype('float32')}
+                if model.phase_train_name:
+                    feed[model.phase_train_name] = np.array(False)
+                return feed
+
+        quantize_static(args.onnx_model, args.output, FaceReader(), activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+    print(f"Quantized {args.onnx_model} to {args.output} ({args.mode})")
+
+
+def load_faces(args):
+    if args.images:
+        paths = sorted(os.path.join(args.images, name) for name in os.listdir(args.images))
+        return [np.array(Image.open(path).convert("RGB")) for path in paths[:args.count]]
+    # Random crops of varying size exercise the resize and standardization steps
+    rng = np.random.default_rng(args.seed)
+    return [rng.integers(0, 256, size=(rng.integers(60, 400), rng.integers(60, 400), 3)).astype('uint8') for _ in range(args.count)]
+
+
+def load_model(path, threads=None):
+    from app.core.facenet import FaceNetModel, OnnxFaceNetModel
+
+    if path.endswith(".onnx"):
+        return OnnxFaceNetModel(path, threads=threads)
+    return FaceNetModel(path)
+
+
+def latency(model, faces, batch_size, repeats):
+    model.get_embeddings_batch(faces[:batch_size])
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(0, len(faces), batch_size):
+            model.get_embeddings_batch(faces[i:i + batch_size])
+        timings.append((time.perf_counter() - start) * 1000 / len(faces))
+    return float(np.median(timings))
+
+
+def matches(embeddings, k, threshold):
+    # Same search as findme: top k neighbours closer than the threshold
+    import faiss
+
+    index = faiss.IndexFlatL2(embeddings.shape[1])
+    index.add(np.ascontiguousarray(embeddings, dtype='float32'))
+    distances, indices = index.search(np.ascontiguousarray(embeddings, dtype='float32'), min(k, len(embeddings)))
+    return [set(row[(row >= 0) & (distance < threshold)]) for distance, row in zip(distances, indices)]
+
+
+def match_overlap(expected, actual, k, threshold):
+    overlaps = []
+    for expected_matches, actual_matches in zip(matches(expected, k, threshold), matches(actual, k, threshold)):
+        union = expected_matches | actual_matches
+        if union:
+            overlaps.append(len(expected_matches & actual_matches) / len(union))
+    return float(np.mean(overlaps)) if overlaps else 1.0
+
+
+def compare(args):
+    faces = load_faces(args)
+    reference = load_model(args.reference or config.pre_trained_model)
+    candidate = load_model(args.candidate, threads=args.threads)
+
+    expected = reference.get_embeddings_batch(faces)
+    actual = candidate.get_embeddings_batch(faces)
+    cosine = np.sum(expected * actual, axis=1) / (np.linalg.norm(expected, axis=1) * np.linalg.norm(actual, axis=1))
+    # Findme matches on L2 distance, so the pairwise distances must agree as well
+    expected_distances = np.linalg.norm(expected[:, None] - expected[None], axis=2)
+    actual_distances = np.linalg.norm(actual[:, None] - actual[None], axis=2)
+    overlap = match_overlap(expected, actual, args.k, args.threshold)
+    print(f"Faces: {len(faces)}")
+    print(f"Cosine similarity: min {cosine.min():.6f}, mean {cosine.mean():.6f}")
+    print(f"Max abs difference: {np.abs(expected - actual).max():.6f}")
+    print(f"Max pairwise L2 distance difference: {np.abs(expected_distances - actual_distances).max():.6f}")
+    print(f"Findme match overlap (k={args.k}, threshold={args.threshold}): {overlap:.4f}")
+
+    print(f"{'batch':>6} {'reference ms/face':>18} {'candidate ms/face':>18}")
+    for batch_size in args.batch_size:
+        print(f"{batch_size:>6} {latency(reference, faces, batch_size, args.repeats):>18.2f} {latency(candidate, faces, batch_size, args.repeats):>18.2f}")
+
+    failed = False
+    if cosine.min() < args.min_cosine:
+        print(f"Parity check failed: cosine similarity below {args.min_cosine}")
+        failed = True
+    if overlap < args.min_overlap:
+        print(f"Parity check failed: findme match overlap below {args.min_overlap}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("Parity check passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, quantize and compare FaceNet models")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Convert the frozen graph to ONNX (requires tf2onnx)")
+    export_parser.add_argument("--model", default=None, help="Frozen TensorFlow graph, defaults to PRE_TRAINED_MODEL")
+    export_parser.add_argument("--output", default=config.onnx_model)
+    export_parser.add_argument("--opset", type=int, default=13)
+    export_parser.set_defaults(func=export)
+
+    quantize_parser = subparsers.add_parser("quantize", help="Write an int8 post-training quantized copy of the ONNX model")
+    quantize_parser.add_argument("--onnx-model", default=config.onnx_model)
+    quantize_parser.add_argument("--output", default="facenet.int8.onnx")
+    quantize_parser.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    quantize_parser.add_argument("--images", default=None, help="Directory of face crops used for calibration")
+    quantize_parser.add_argument("--count", type=int, default=200)
+    quantize_parser.add_argument("--seed", type=int, default=0)
+    quantize_parser.set_defaults(func=quantize)
+
+    compare_parser = subparsers.add_parser("compare", help="Check embedding parity, findme overlap and per-face latency")
+    compare_parser.add_argument("--reference", default=None, help="Reference model, defaults to PRE_TRAINED_MODEL")
+    compare_parser.add_argument("--candidate", default=config.onnx_model, help="Model to check, .onnx files run on ONNX Runtime")
+    compare_parser.add_argument("--images", default=None, help="Directory of face crops, random crops are used when omitted")
+    compare_parser.add_argument("--count", type=int, default=64)
+    compare_parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8, 32])
+    compare_parser.add_argument("--repeats", type=int, default=5)
+    compare_parser.add_argument("--threads", type=int, default=None)
+    compare_parser.add_argument("-k", type=int, default=10)
+    compare_parser.add_argument("--threshold", type=float, default=0.8)
+    compare_parser.add_argument("--min-cosine", type=float, default=0.999)
+    compare_parser.add_argument("--min-overlap", type=float, default=0.95)
+    compare_parser.add_argument("--seed", type=int, default=0)
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+import numpy as np
+
+from app.core.faiss_vector import FaissVector
+
+
+def rebuild(args):
+    faiss_vector = FaissVector(index_file=args.index_file)
+    print(f"Rebuilding {args.index_file} ({faiss_vector.index.ntotal} vectors) as {args.type}")
+    faiss_vector.rebuild(args.type)
+    print(f"Done: {type(faiss_vector.base_index()).__name__}")
+
+
+def compact(args):
+    faiss_vector = FaissVector(index_file=args.index_file)
+    print(f"Compacting {args.index_file} ({len(faiss_vector.tombstones)} deleted of {faiss_vector.index.ntotal} vectors)")
+    faiss_vector.compact()
+    print(f"Done: {faiss_vector.index.ntotal} vectors")
+
+
+def measure(index, queries, k):
+    start = time.perf_counter()
+    _, indices = index.search(queries, k)
+    latency = (time.perf_counter() - start) * 1000 / len(queries)
+    return indices, latency
+
+
+def measure_range(index, queries, vectors, threshold, margin):
+    # Findme range-searches a widened radius on compressed indexes and filters on exact distance
+    start = time.perf_counter()
+    lims, _, candidates = index.range_search(queries, threshold * (1 + margin))
+    indices = []
+    for i, query in enumerate(queries):
+        row = candidates[lims[i]:lims[i + 1]]
+        exact = np.sum((vectors[row] - query) ** 2, axis=1)
+        indices.append(row[exact < threshold])
+    latency = (time.perf_counter() - start) * 1000 / len(queries)
+    return indices, latency
+
+
+def bytes_per_vector(index):
+    return faiss.serialize_index(index).size / max(index.ntotal, 1)
+
+
+def recall(indices, truth):
+    hits = [len(set(found) & set(expected)) for found, expected in zip(indices, truth)]
+    return sum(hits) / max(sum(len(expected) for expected in truth), 1)
+
+
+def report(args):
+    faiss_vector = FaissVector(index_file=args.index_file)
+    _, vectors = faiss_vector.reconstruct_all()
+    if len(vectors) == 0:
+        print("Index is empty, nothing to report")
+        return
+
+    rng = np.random.default_rng(args.seed)
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    k = min(args.k, len(vectors))
+
+    flat = faiss.IndexFlatL2(faiss_vector.dim)
+    flat.add(vectors)
+    truth, latency = measure(flat, queries, k)
+    rows = [("flat", "-", 1.0, latency, bytes_per_vector(flat))]
+    lims, _, matches = flat.range_search(queries, args.threshold)
+    range_truth = [matches[lims[i]:lims[i + 1]] for i in range(len(queries))]
+
+    ivf = faiss_vector.create_base_index("ivf", vectors)
+    if faiss.try_extract_index_ivf(ivf) is not None:
+        ivf.add(vectors)
+        for nprobe in args.nprobe:
+            faiss_vector.apply_search_params(ivf, nprobe=nprobe)
+            indices, latency = measure(ivf, queries, k)
+            rows.append(("ivf", f"nprobe={nprobe}", recall(indices, truth), latency, bytes_per_vector(ivf)))
+
+    hnsw = faiss_vector.create_base_index("hnsw")
+    hnsw.add(vectors)
+    for ef_search in args.ef_search:
+        faiss_vector.apply_search_params(hnsw, ef_search=ef_search)
+        indices, latency = measure(hnsw, queries, k)
+        rows.append(("hnsw", f"efSearch={ef_search}", recall(indices, truth), latency, bytes_per_vector(hnsw)))
+
+    for index_type in ("sq8", "pq"):
+        compressed = faiss_vector.create_base_index(index_type, vectors)
+        if not faiss_vector.is_lossy(compressed):
+            continue
+        compressed.add(vectors)
+        indices, latency = measure(compressed, queries, k)
+        rows.append((index_type, "-", recall(indices, truth), latency, bytes_per_vector(compressed)))
+        for margin in args.rerank_margin:
+            indices, latency = measure_range(compressed, queries, vectors, args.threshold, margin)
+            rows.append((index_type, f"margin={margin}", recall(indices, range_truth), latency, bytes_per_vector(compressed)))
+
+    print(f"{len(vectors)} vectors, {len(queries)} queries, recall@{k} against flat, margin rows: range recall at {args.threshold}")
+    print(f"{'index':<8}{'params':<16}{'recall':>8}{'ms/query':>12}{'bytes/vector':>14}")
+    for name, params, value, latency, size in rows:
+        print(f"{name:<8}{params:<16}{value:>8.3f}{latency:>12.3f}{size:>14.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline FAISS index maintenance")
+    parser.add_argument("--index-file", default="faiss_index.bin")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = commands.add_parser("rebuild", help="Rebuild the index with another index type")
+    rebuild_parser.add_argument("--type", choices=["flat", "ivf", "hnsw", "sq8", "pq"], required=True)
+    rebuild_parser.set_defaults(func=rebuild)
+
+    compact_parser = commands.add_parser("compact", help="Drop deleted vectors from tombstoned indexes")
+    compact_parser.set_defaults(func=compact)
+
+    report_parser = commands.add_parser("report", help="Recall, latency and memory of IVF/HNSW/SQ8/PQ settings against flat")
+    report_parser.add_argument("--queries", type=int, default=200)
+    report_parser.add_argument("-k", type=int, default=10)
+    report_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    report_parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    report_parser.add_argument("--rerank-margin", type=float, nargs="+", default=[0, 0.1, 0.25, 0.5])
+    report_parser.add_argument("--threshold", type=float, default=0.8)
+    report_parser.add_argument("--seed", type=int, default=0)
+    report_parser.set_defaults(func=report)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import Binary
+
+from app.core.database import database
+from app.model.face_model import encode_embeddings
+
+# Rewrite embeddings stored as float lists into packed float32 binaries
+for name in ["photos", "faces"]:
+    collection = database.get_collection(name)
+    migrated = 0
+    for document in collection.find({"detections.embeddings": {"$type": "array"}}, {"detections": 1}):
+        detections = document["detections"]
+        for detection in detections:
+            if "embeddings" in detection:
+                detection["embeddings"] = Binary(encode_embeddings(detection["embeddings"]))
+        collection.update_one({"_id": document["_id"]}, {"$set": {"detections": detections}})
+        migrated += 1
+    print(f"{name}: migrated {migrated} documents")
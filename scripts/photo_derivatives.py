@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+from io import BytesIO
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import config
+from app.core.derivatives import upload_derivatives
+from app.core.storage import storage
+from app.repository.photo_repository import PhotoRepository
+
+
+def backfill(args):
+    # Renders the thumbnail and medium renditions of photos uploaded before they existed
+    photo_repository = PhotoRepository()
+    created = failed = 0
+    for photo in photo_repository.find_without_derivatives():
+        if args.limit and created + failed >= args.limit:
+            break
+        path = storage.object_key(photo["url"])
+        try:
+            data = BytesIO()
+            storage.download_file(config.aws_bucket, path, data)
+            photo_repository.set_derivatives(photo["_id"], upload_derivatives(data.getvalue(), path))
+            created += 1
+        except Exception as e:
+            print(f"Skipped {photo['_id']}: {str(e)}")
+            failed += 1
+    print(f"Created renditions of {created} photos, {failed} failed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the thumbnail and medium photo renditions")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill_parser = commands.add_parser("backfill", help="Create renditions of photos that have none")
+    backfill_parser.add_argument("--limit", type=int, default=0, help="Stop after this many photos, 0 processes all")
+    backfill_parser.set_defaults(func=backfill)
+
+    args = parser.parse_args()
+    args.func(args)